@@ -1,54 +1,47 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from rps.robotarium import Robotarium
-import math
+from rps.utilities.spatial import NeighborTracker
+from rps.utilities.swarm import PositionMapping, SwarmState
 
 num_robots = 5
 bounding_box = [-1.5, 1.5, -1.5, 1.5]
 communication_range = 0.2
+neighbor_skin = 0.1
 num_iterations = 10
 std_noise = 0.05 
 
-class Robot:
-    def __init__(self, robot_id, x, y):
-        self.id = robot_id
-        self.x = x
-        self.y = y
-        self.leader_id = None
-        self.neighbors = []
-        self.leader_bid = 0
-
-    def update_neighbors(self, all_robots):
-        self.neighbors = [robot for robot in all_robots if robot.id != self.id and self.distance_to(robot) <= communication_range]
-
-    def distance_to(self, other_robot):
-        return math.sqrt((self.x - other_robot.x)**2 + (self.y - other_robot.y)**2)
-
 class RobotariumExtended(Robotarium):
     def __init__(self, number_of_robots, show_figure=True, std_noise=0.05):  # Pass std_noise as a parameter
         self.num_robots = number_of_robots
         self.std_noise = std_noise  # Store std_noise
         super().__init__(number_of_robots, show_figure)
-        self.robots = []
-        self.true_positions = {}
         self.initialize_robots()
         self.leader = self.leader_election()
 
+    # Robot positions and neighbors live in self.swarm's arrays; robots are views onto it
+    @property
+    def robots(self):
+        return self.swarm.robots()
+
     def initialize_robots(self):
-        for i in range(self.num_robots):
-            x = np.random.uniform(bounding_box[0], bounding_box[1])
-            y = np.random.uniform(bounding_box[2], bounding_box[3])
-            robot = Robot("fb" + str(i), x, y)
-            self.robots.append(robot)
-            self.true_positions[robot.id] = (x, y)
+        # Ranges are exact here, so the swarm is created without range noise
+        positions = np.random.uniform(bounding_box[::2], bounding_box[1::2], size=(self.num_robots, 2))
+        self.swarm = SwarmState(positions, 0, communication_range, "fb")
+        self.true_positions = PositionMapping(self.swarm, positions.copy())
+        self.neighbor_tracker = NeighborTracker(self.swarm.positions, communication_range, neighbor_skin)
+
+    def find_neighbors(self):
+        # Only robots that drifted out of their skin get their neighbor candidates rebuilt
+        self.neighbor_events = self.neighbor_tracker.update(self.swarm.positions)
+        first, second = self.neighbor_tracker.edges
+        self.swarm.set_neighbors(np.concatenate((first, second)), np.concatenate((second, first)))
 
     def leader_election(self):
-        for robot in self.robots:
-            robot.update_neighbors(self.robots)
-            robot.leader_bid = len(robot.neighbors)
-        leader = max(self.robots, key=lambda x: x.leader_bid)
-        leader.leader_id = leader.id
-        return leader
+        self.find_neighbors()
+        self.swarm.leader_bids = self.swarm.degrees()
+        self.swarm.leader = int(np.argmax(self.swarm.leader_bids))
+        return self.robots[self.swarm.leader]
     
 r = RobotariumExtended(number_of_robots=num_robots, show_figure=True, std_noise=std_noise)
 
@@ -63,23 +56,13 @@ for iteration in range(num_iterations):
     poses = r.get_poses()
     ground_truth_poses.append(poses.copy())
 
-    relative_pos = []
-    for i, robot in enumerate(r.robots):
-        robot.x, robot.y = poses[0, i], poses[1, i]
-        rel_x = robot.x - r.leader.x
-        rel_y = robot.y - r.leader.y
-        relative_pos.append((rel_x, rel_y))
-    
-    relative_positions.append(relative_pos)
+    r.swarm.positions[:] = poses[:2].T
+    relative_positions.append(r.swarm.positions - r.swarm.positions[r.leader.index])
 
-    error = np.linalg.norm(np.array(poses[:2]) - np.array([[robot.x], [robot.y]])).max()
+    error = np.linalg.norm(poses[:2] - r.swarm.positions[-1][:, np.newaxis])
     errors.append(error)
-    for robot in r.robots:
-        robot.update_neighbors(r.robots)
-    for robot in r.robots:
-        velocity = np.random.normal(0, r.std_noise, size=(2,))  # Apply noise using normal distribution
-        robot.x += velocity[0]
-        robot.y += velocity[1]
+    # Apply noise using normal distribution
+    r.swarm.positions += np.random.normal(0, r.std_noise, size=(num_robots, 2))
     
     r.leader = r.leader_election()
 
@@ -98,7 +81,7 @@ for iteration in range(num_iterations):
 
 ground_truth_poses = np.array(ground_truth_poses)
 ground_truth_poses_flat = ground_truth_poses.reshape(-1, num_robots * 2)
-estimated_poses_flat = np.array([[robot.x, robot.y] for robot in r.robots]).flatten()
+estimated_poses_flat = r.swarm.positions.flatten()
 
 mse = np.mean((estimated_poses_flat - ground_truth_poses_flat)**2)
 print(f'Mean Squared Error (MSE): {mse}')
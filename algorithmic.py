@@ -1,5 +1,15 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
-import matplotlib.pyplot as plt
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import breadth_first_order, minimum_spanning_tree
+from rps.utilities.graph import farthest_point_landmarks, graph_distances, partition_graph, ragged_ranges
+from rps.utilities.ranging import apply_range_noise, detectable_distance
+from rps.utilities.spatial import NeighborTracker, create_spatial_index
+from rps.utilities.localization import anchor_geometry, classical_mds, landmark_mds, multilaterate, rigid_alignments, robust_multilaterate
+from rps.utilities.metrics import edge_distance_errors
+from rps.utilities.swarm import PositionMapping, SwarmState
 
 class Robot:
     def __init__(self, id, x, y, std_noise):
@@ -17,99 +27,446 @@ class Robot:
 
     def distance_to(self, other_robot):
         true_distance_squared = (self.x - other_robot.x)**2 + (self.y - other_robot.y)**2
-        # Generate noise with a lower bound to prevent negative squared distance
-        lower_bound = -np.sqrt(true_distance_squared) / self.std_noise
-        noise = self.std_noise * np.clip(np.random.randn(), lower_bound, None)
-        noisy_distance_squared = true_distance_squared + noise
-        return np.sqrt(noisy_distance_squared)
+        # Noise is clipped from below to prevent negative squared distance
+        return apply_range_noise(true_distance_squared, self.std_noise)[()]
 
 class Environment:
-    def __init__(self, num_robots, std_noise):
+    def __init__(self, num_robots, std_noise, neighbor_radius=2, arena_size=10, spatial_index="grid", multilateration="closed_form", localization="trilateration", robust_loss="huber", ransac_hypotheses=0, min_anchor_geometry=0.3, landmarks=20, clusters=1, processes=None, neighbor_skin=None, rng=None):
         self.num_robots = num_robots
         self.std_noise = std_noise
-        self.robots = []
-        self.true_positions = {}
-        self.new_coordinate_positions = {}
+        self.neighbor_radius = neighbor_radius
+        self.arena_size = arena_size
+        self.spatial_index = spatial_index
+        self.multilateration = multilateration
+        # "trilateration" localizes against the leader and its two references only;
+        # "robust" then re-solves every robot against the whole leader neighborhood;
+        # "multihop" grows the frame ring by ring through the neighbor graph;
+        # "mds" and "landmark_mds" embed shortest-path completed ranges
+        assert localization in ("trilateration", "robust", "multihop", "mds", "landmark_mds"), "The localization mode must be 'trilateration', 'robust', 'multihop', 'mds' or 'landmark_mds'. Recieved %r." % localization
+        self.localization = localization
+        self.robust_loss = robust_loss
+        self.ransac_hypotheses = ransac_hypotheses
+        # Multi-hop robots whose anchors are closer to collinear than this wait for a later ring
+        self.min_anchor_geometry = min_anchor_geometry
+        # Landmark MDS only needs ranges from this many landmarks: O(landmarks*N) instead of O(N^3)
+        self.landmarks = landmarks
+        # With several clusters each one elects its own leader and builds its frame in a
+        # worker process (processes=None for one per core, 1 to stay in this process)
+        self.clusters = clusters
+        self.processes = processes
+        # With a skin the neighbor graph is tracked incrementally as robots move
+        self.neighbor_skin = neighbor_skin
+        self.neighbor_tracker = None
+        # Source of every random draw (positions and range noise); the global numpy stream by default
+        self.rng = np.random if rng is None else rng
+        self.swarm = SwarmState(np.zeros((0, 2)), std_noise, neighbor_radius, "rb", self.rng)
+
+    # Robots, positions and the neighbor graph all live in self.swarm's arrays;
+    # the attributes below are views onto it for code written against Robot objects.
+    @property
+    def robots(self):
+        return self.swarm.robots()
+
+    @property
+    def positions(self):
+        return self.swarm.positions
+
+    @property
+    def estimated_positions(self):
+        return self.swarm.estimated_positions
+
+    @property
+    def true_positions(self):
+        return PositionMapping(self.swarm, self.swarm.positions)
+
+    @property
+    def new_coordinate_positions(self):
+        return PositionMapping(self.swarm, self.swarm.estimated_positions, self.swarm.localized)
 
     def initialize_robots(self):
-        self.robots = []
-        self.true_positions = {}
-        self.new_coordinate_positions = {}
-        for i in range(self.num_robots):
-            x = np.random.uniform(0, 10)
-            y = np.random.uniform(0, 10)
-            robot = Robot("rb" + str(i), x, y, self.std_noise)
-            self.robots.append(robot)
-            self.true_positions[robot.id] = (x, y)
+        # Row i holds robot i's (x, y); drawn in the same order as one robot at a time
+        positions = self.rng.uniform(0, self.arena_size, size=(self.num_robots, 2))
+        self.swarm = SwarmState(positions, self.std_noise, self.neighbor_radius, "rb", self.rng)
+        if self.neighbor_skin is not None:
+            candidate_radius = detectable_distance(self.neighbor_radius, self.std_noise)
+            self.neighbor_tracker = NeighborTracker(self.positions, candidate_radius, self.neighbor_skin)
+
+    def move_robots(self, displacements):
+        """Moves every robot by its row of displacements (Nx2 numpy array).
+
+        With a neighbor tracker, returns its (added, removed) pairs of robots
+        that came into or left measuring range; otherwise returns None.
+        """
+        self.swarm.positions += displacements
+        moved = np.flatnonzero(np.any(np.broadcast_to(displacements, self.positions.shape) != 0, axis=1))
+        self.swarm.range_cache.invalidate(moved)
+        if self.neighbor_tracker is not None:
+            return self.neighbor_tracker.update(self.positions, moved)
+
+    def find_neighbors(self):
+        # Only pairs whose noisy range could fall inside the radius are measured
+        if self.neighbor_tracker is not None:
+            first, second = self.neighbor_tracker.edges
+        else:
+            candidate_radius = detectable_distance(self.neighbor_radius, self.std_noise)
+            index = create_spatial_index(self.positions, candidate_radius, self.spatial_index)
+            first, second = index.query_pairs(candidate_radius)
+
+        # Each robot measures each candidate itself, so both directions get their own noise;
+        # sorted by (row, col) once, the cache and the CSR build below find them in order
+        rows = np.concatenate((first, second))
+        cols = np.concatenate((second, first))
+        order = np.argsort(rows*self.num_robots + cols)
+        rows, cols = rows[order], cols[order]
+        ranges = self.swarm.range_cache.measure(rows, cols)
+        within = ranges <= self.neighbor_radius
+        self.swarm.set_neighbors(rows[within], cols[within], ranges[within])
 
     def leader_election(self):
-        for robot in self.robots:
-            robot.update_neighbors(self.robots)
-            robot.leader_bid = len(robot.neighbors)
-        leader = max(self.robots, key=lambda x: x.leader_bid)
-        leader.leader_id = leader.id
-        return leader
+        self.find_neighbors()
+        self.swarm.leader_bids = self.swarm.degrees()
+        self.swarm.leader = int(np.argmax(self.swarm.leader_bids))
+        return self.robots[self.swarm.leader]
 
     def select_reference_robots(self, leader):
-        sorted_neighbors = sorted(leader.neighbors, key=lambda x: leader.distance_to(x))
-        reference_robots = sorted_neighbors[:2]
-        leader.reference_robots = reference_robots
-        return reference_robots
+        start, end = self.swarm.neighbor_indptr[leader.index], self.swarm.neighbor_indptr[leader.index + 1]
+        nearest = self.swarm.neighbor_indices[start:end][np.argsort(self.swarm.neighbor_ranges[start:end], kind="stable")[:2]]
+        if self.localization == "multihop" and end - start > 2:
+            nearest = self.widest_reference_pair(leader)
+        self.swarm.reference = nearest
+        return [self.robots[j] for j in nearest.tolist()]
+
+    def widest_reference_pair(self, leader):
+        # A multi-hop frame is only as good as its first triangle, so take the pair of
+        # leader neighbors whose triangle with the leader has the largest smallest angle
+        neighbors = self.swarm.neighbors_of(leader.index)
+        ranges = self.swarm.neighbor_ranges[self.swarm.neighbor_indptr[leader.index]:self.swarm.neighbor_indptr[leader.index + 1]]
+        a, b = np.triu_indices(neighbors.size, 1)
+        z_la, z_lb = ranges[a], ranges[b]
+        z_ab = self.swarm.range_cache.measure(neighbors[a], neighbors[b])
+
+        with np.errstate(all="ignore"):
+            cosines = np.stack(((z_la**2 + z_lb**2 - z_ab**2)/(2*z_la*z_lb),
+                                (z_la**2 + z_ab**2 - z_lb**2)/(2*z_la*z_ab),
+                                (z_lb**2 + z_ab**2 - z_la**2)/(2*z_lb*z_ab)))
+            smallest_angle = np.min(np.arccos(cosines), axis=0)
+        best = np.argmax(np.nan_to_num(smallest_angle, nan=-1))
+
+        return neighbors[[a[best], b[best]]]
 
     def triangulate_positions(self, leader, ref_a, ref_b, other_robot):
-        x1, y1 = self.new_coordinate_positions[leader.id]
-        x2, y2 = self.new_coordinate_positions[ref_a.id]
-        x3, y3 = self.new_coordinate_positions[ref_b.id]
-        
-        d1 = other_robot.distance_to(leader)
-        d2 = other_robot.distance_to(ref_a)
-        d3 = other_robot.distance_to(ref_b)
-        A = 2*x2 - 2*x1
-        B = 2*y2 - 2*y1
-        C = d1**2 - d2**2 - x1**2 + x2**2 - y1**2 + y2**2
-        D = 2*x3 - 2*x2
-        E = 2*y3 - 2*y2
-        F = d2**2 - d3**2 - x2**2 + x3**2 - y2**2 + y3**2
-        
-        x = (C*E - F*B) / (E*A - B*D)
-        y = (C*D - A*F) / (B*D - A*E)
-        
+        anchors = [leader.index, ref_a.index, ref_b.index]
+        k = other_robot.index
+        ranges = self.swarm.range_cache.measure([k, k, k], anchors)
+        x, y = multilaterate(self.estimated_positions[anchors], ranges[np.newaxis, :])[0]
+
         return x, y
 
     def calculate_new_positions(self, leader, reference_robots):
-        z_la = leader.distance_to(reference_robots[0])
-        z_lb = leader.distance_to(reference_robots[1])
-        z_ab = reference_robots[0].distance_to(reference_robots[1])
+        if self.localization in ("mds", "landmark_mds"):
+            self.embed_positions(leader, reference_robots)
+            return
+
+        l = leader.index
+        a = reference_robots[0].index
+        b = reference_robots[1].index
+        z_la, z_lb, z_ab = self.swarm.range_cache.measure([l, l, a], [a, b, b])
 
         x_a = (z_ab**2 + z_la**2 - z_lb**2) / (2 * z_ab)
         x_b = (z_la**2 - z_ab**2 -z_lb**2) / (2 * z_ab)
         y_l = np.sqrt(z_la - x_a**2)
 
-        self.new_coordinate_positions[leader.id] = (0, y_l)
-        self.new_coordinate_positions[reference_robots[0].id] = (-abs(x_a), 0)  
-        self.new_coordinate_positions[reference_robots[1].id] = (abs(x_b), 0)   
+        anchors = np.array([l, a, b])
+        self.estimated_positions[anchors] = [(0, y_l), (-abs(x_a), 0), (abs(x_b), 0)]
+
+        if self.localization == "multihop":
+            # Any mismatch between this triangle and its measured ranges compounds ring
+            # after ring, so the multi-hop frame places the anchors exactly
+            self.estimated_positions[anchors] = [(0, np.sqrt(z_la**2 - x_a**2)), (-x_a, 0), (z_ab - x_a, 0)]
+            self.propagate_positions(anchors)
+            return
+
+        # All remaining robots are localized against the three anchors in one batch
+        others = np.setdiff1d(np.arange(self.num_robots), anchors)
+        ranges = self.swarm.range_cache.measure(np.repeat(others, 3), np.tile(anchors, others.size))
+        self.estimated_positions[others] = multilaterate(self.estimated_positions[anchors], ranges.reshape(-1, 3), self.multilateration)
+        self.swarm.localized[:] = True
+
+        if self.localization == "robust":
+            self.refine_positions(leader)
+
+    def refine_positions(self, leader):
+        # The leader and its neighbors, already placed in the frame, serve as anchors for everyone else
+        anchors = np.union1d([leader.index], self.swarm.neighbors_of(leader.index))
+        anchors = anchors[np.isfinite(self.estimated_positions[anchors]).all(axis=1)]
+        others = np.setdiff1d(np.arange(self.num_robots), anchors)
+
+        ranges = self.swarm.range_cache.measure(np.repeat(others, anchors.size), np.tile(anchors, others.size))
+        ranges = ranges.reshape(others.size, anchors.size)
+        # Noise on the squared distance gives a range standard deviation proportional to 1/range
+        positions, _ = robust_multilaterate(self.estimated_positions[anchors], ranges, weights=ranges**2, loss=self.robust_loss,
+                                            ransac_hypotheses=self.ransac_hypotheses, rng=self.rng)
+        self.estimated_positions[others] = positions
+
+    def embed_positions(self, leader, reference_robots):
+        # Ranges the neighbor graph did not measure are completed by shortest paths (MDS-MAP);
+        # only robots connected to the leader can be embedded
+        swarm = self.swarm
+        if self.localization == "mds":
+            distances = graph_distances(swarm.neighbor_indptr, swarm.neighbor_indices, swarm.neighbor_ranges)
+            connected = np.flatnonzero(np.isfinite(distances[leader.index]))
+            embedded = classical_mds(distances[np.ix_(connected, connected)])
+        else:
+            landmarks, distances = farthest_point_landmarks(swarm.neighbor_indptr, swarm.neighbor_indices, swarm.neighbor_ranges,
+                                                            leader.index, self.landmarks)
+            connected = np.flatnonzero(np.isfinite(distances[0]))
+            if landmarks.size < 3:
+                embedded = np.full((connected.size, 2), np.nan)
+            else:
+                embedded = landmark_mds(distances[:, connected], np.searchsorted(connected, landmarks))
+
+        # Express the map in the leader frame: references on the x axis, leader above the origin
+        l, a, b = embedded[np.searchsorted(connected, [leader.index] + [robot.index for robot in reference_robots])]
+        x_axis = (b - a)/np.linalg.norm(b - a)
+        origin = a + np.dot(l - a, x_axis)*x_axis
+        y_axis = np.array([-x_axis[1], x_axis[0]])
+        if np.dot(l - origin, y_axis) < 0:
+            y_axis = -y_axis
+
+        self.estimated_positions[:] = np.nan
+        self.estimated_positions[connected] = (embedded - origin) @ np.column_stack((x_axis, y_axis))
+        self.swarm.localized[:] = False
+        self.swarm.localized[connected] = True
+
+    def propagate_positions(self, anchors):
+        # Breadth-first over the neighbor graph: robots with three or more localized
+        # neighbors are solved against them as one batch, then anchor the next ring
+        N = self.num_robots
+        localized = np.zeros(N, dtype=bool)
+        localized[anchors] = np.isfinite(self.estimated_positions[anchors]).all(axis=1)
+        self.estimated_positions[~localized] = np.nan
+
+        # Edges sorted by the measured robot tell whose anchor count a newly localized robot raises
+        rows, cols = self.swarm.edges()
+        by_measured = np.argsort(cols, kind="stable")
+        measured_indptr = np.searchsorted(cols[by_measured], np.arange(N + 1))
+        anchor_counts = np.zeros(N, dtype=np.int64)
+        gained_anchors = np.zeros(N, dtype=bool)
+        # Latest solution and its anchor_geometry score for robots still waiting
+        candidates = np.full((N, 2), np.nan)
+        geometry = np.full(N, -1.0)
+
+        new = np.flatnonzero(localized)
+        while new.size:
+            starts = measured_indptr[new]
+            counts = measured_indptr[new + 1] - starts
+            watchers = rows[by_measured[ragged_ranges(starts, counts)]]
+            anchor_counts += np.bincount(watchers, minlength=N)
+            gained_anchors[watchers] = True
+
+            # Only robots whose anchor set grew need solving again
+            ring = np.flatnonzero(gained_anchors & ~localized & (anchor_counts >= 3))
+            gained_anchors[:] = False
+            if ring.size:
+                slots = self.swarm.edge_slots(ring)
+                keep = localized[self.swarm.neighbor_indices[slots]]
+                slots = slots[keep]
+                ring_rows = np.repeat(ring, self.swarm.neighbor_indptr[ring + 1] - self.swarm.neighbor_indptr[ring])[keep]
+
+                # Edges are grouped by robot, so each robot's anchors fill one padded row of the batch
+                slot = np.searchsorted(ring, ring_rows)
+                column = np.arange(slots.size) - np.searchsorted(ring_rows, ring)[slot]
+                batch_anchors = np.full((ring.size, anchor_counts[ring].max(), 2), np.nan)
+                batch_ranges = np.full(batch_anchors.shape[:2], np.nan)
+                batch_anchors[slot, column] = self.estimated_positions[self.swarm.neighbor_indices[slots]]
+                batch_ranges[slot, column] = self.swarm.neighbor_ranges[slots]
+
+                positions, _ = robust_multilaterate(batch_anchors, batch_ranges, weights=batch_ranges**2, loss=self.robust_loss,
+                                                    ransac_hypotheses=self.ransac_hypotheses, rng=self.rng)
+                candidates[ring] = positions
+                geometry[ring] = np.nan_to_num(anchor_geometry(positions, batch_anchors, np.isfinite(batch_ranges)), nan=-1)
+
+            new = np.flatnonzero(geometry >= self.min_anchor_geometry)
+            if new.size == 0 and geometry.max() > 1e-3:
+                # Rather than stall, advance with the best-conditioned robots still waiting
+                new = np.flatnonzero(geometry >= geometry.max()/2)
+            self.estimated_positions[new] = candidates[new]
+            localized[new] = True
+            geometry[new] = -1
+
+        self.swarm.localized[:] = localized
+
+    def localize_clusters(self):
+        """Localizes the swarm with one leader per graph cluster.
+
+        The neighbor graph is split into self.clusters clusters.  Every
+        cluster, extended by a one-hop halo so adjacent clusters share robots,
+        builds its own frame around its leader in a worker process.  The
+        frames are then chained into the frame of cluster 0, whose leader has
+        the highest degree, along a spanning tree of rigid alignments that
+        prefers the largest overlaps.
+
+        -> list of RobotView (cluster leaders)
+        """
+        self.find_neighbors()
+        swarm = self.swarm
+        swarm.leader_bids = swarm.degrees()
+        leaders, labels = partition_graph(swarm.neighbor_indptr, swarm.neighbor_indices, min(self.clusters, self.num_robots))
+
+        options = dict(neighbor_radius=self.neighbor_radius, multilateration=self.multilateration, localization=self.localization,
+                       robust_loss=self.robust_loss, ransac_hypotheses=self.ransac_hypotheses, min_anchor_geometry=self.min_anchor_geometry,
+                       landmarks=self.landmarks)
+        seeds = np.random.SeedSequence([int(x) for x in self.rng.uniform(0, 2**32, size=4)]).spawn(leaders.size)
+
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(leaders.size + 1))
+        local = np.full(self.num_robots, -1)
+        members_of, jobs = [], []
+        for c in range(leaders.size):
+            home = order[bounds[c]:bounds[c + 1]]
+            members = np.union1d(home, swarm.neighbor_indices[swarm.edge_slots(home)])
+            local[members] = np.arange(members.size)
+            slots = swarm.edge_slots(members)
+            cols = local[swarm.neighbor_indices[slots]]
+            keep = cols >= 0
+            rows = np.repeat(np.arange(members.size), swarm.neighbor_indptr[members + 1] - swarm.neighbor_indptr[members])[keep]
+            jobs.append((self.positions[members], rows, cols[keep], swarm.neighbor_ranges[slots][keep], local[leaders[c]], self.std_noise, options, seeds[c]))
+            local[members] = -1
+            members_of.append(members)
 
-        for robot in self.robots:
-            if robot not in [leader] + reference_robots:
-                x, y = self.triangulate_positions(leader, reference_robots[0], reference_robots[1], robot)
-                self.new_coordinate_positions[robot.id] = (x, y)
+        workers = min(self.processes or os.cpu_count() or 1, len(jobs))
+        if workers <= 1:
+            results = [_localize_cluster(*job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_localize_cluster, *zip(*jobs)))
 
+        self.merge_cluster_frames(labels, members_of, results)
+        swarm.leader = int(leaders[0])
+        swarm.reference = members_of[0][results[0][2]]
+
+        return [self.robots[j] for j in leaders.tolist()]
+
+    def merge_cluster_frames(self, labels, members_of, results):
+        C = len(members_of)
+        robots = np.concatenate(members_of)
+        clusters = np.repeat(np.arange(C), [members.size for members in members_of])
+        positions = np.concatenate([estimated for estimated, _, _ in results])
+        usable = np.concatenate([localized for _, localized, _ in results]) & np.isfinite(positions).all(axis=1)
+        home = clusters == labels[robots]
+
+        # A robot localized both at home and in a neighbor's halo ties the two frames together
+        home_entry = np.full(self.num_robots, -1)
+        home_entry[robots[home & usable]] = np.flatnonzero(home & usable)
+        halo = np.flatnonzero(~home & usable & (home_entry[robots] >= 0))
+        at_home = home_entry[robots[halo]]
+        low = np.minimum(clusters[halo], clusters[at_home])
+        high = np.maximum(clusters[halo], clusters[at_home])
+        from_low = (clusters[halo] == low)[:, np.newaxis]
+        pairs, pair_of = np.unique(low*C + high, return_inverse=True)
+        # Each pair's alignment maps its lower cluster's frame into its higher one's
+        rotations, translations = rigid_alignments(np.where(from_low, positions[halo], positions[at_home]),
+                                                   np.where(from_low, positions[at_home], positions[halo]), pair_of, pairs.size)
+
+        valid = np.isfinite(rotations).all(axis=(1, 2))
+        overlap = np.bincount(pair_of, minlength=pairs.size)
+        pair_low, pair_high = np.divmod(pairs, C)
+        tree = minimum_spanning_tree(csr_matrix((1/overlap[valid], (pair_low[valid], pair_high[valid])), shape=(C, C)))
+        visit, parent = breadth_first_order(tree, 0, directed=False, return_predecessors=True)
+
+        frame_rotations = np.full((C, 2, 2), np.nan)
+        frame_translations = np.full((C, 2), np.nan)
+        frame_rotations[0] = np.eye(2)
+        frame_translations[0] = 0
+        for c in visit[1:].tolist():
+            p = parent[c]
+            k = np.searchsorted(pairs, min(c, p)*C + max(c, p))
+            if c < p:
+                rotation, translation = rotations[k], translations[k]
+            else:
+                rotation, translation = rotations[k].T, -rotations[k].T @ translations[k]
+            frame_rotations[c] = frame_rotations[p] @ rotation
+            frame_translations[c] = frame_rotations[p] @ translation + frame_translations[p]
+
+        # Every robot is placed from its home cluster's frame
+        entries = np.flatnonzero(home & usable)
+        owner = clusters[entries]
+        self.estimated_positions[:] = np.nan
+        self.estimated_positions[robots[entries]] = np.einsum('kij,kj->ki', frame_rotations[owner], positions[entries]) + frame_translations[owner]
+        self.swarm.localized[:] = np.isfinite(self.estimated_positions).all(axis=1)
+
+    def calculate_error_statistics(self):
+        # Only edges between two localized robots have an estimated distance
+        rows, cols = self.swarm.edges()
+        both = self.swarm.localized[rows] & self.swarm.localized[cols]
+        rows, cols = rows[both], cols[both]
+        return edge_distance_errors(self.positions, self.estimated_positions, rows, cols)
 
     def calculate_mse(self):
-        errors = []
-        for robot in self.robots:
-            for neighbor in robot.neighbors:
-                true_distance = np.sqrt((self.true_positions[robot.id][0] - self.true_positions[neighbor.id][0])**2 + 
-                                        (self.true_positions[robot.id][1] - self.true_positions[neighbor.id][1])**2)
-                new_distance = np.sqrt((self.new_coordinate_positions[robot.id][0] - self.new_coordinate_positions[neighbor.id][0])**2 +
-                                    (self.new_coordinate_positions[robot.id][1] - self.new_coordinate_positions[neighbor.id][1])**2)
-                error = (true_distance - new_distance)**2
-                errors.append(error)
-        mse = np.mean(errors)
-        return mse
+        return self.calculate_error_statistics()["mse"]
+
+    def localization_rounds(self, num_rounds=None, step_size=0):
+        """Runs localization round after round, yielding each round's result as it finishes.
+
+        Between rounds every robot takes a Gaussian random-walk step of
+        standard deviation step_size.  Only the current round is held, so
+        the generator can run open-ended (num_rounds=None) and consumers
+        decide what to keep, write out or stop on.
+
+        num_rounds: int (rounds to run, None to run until the consumer stops)
+        step_size: double (standard deviation of the per-round motion)
+
+        -> generator of dicts with "round", "leader" (id), "leaders" (ids of
+           every cluster leader), "reference" (list of ids), "estimated_positions" (Nx2 numpy array, nan where a robot
+           was not localized) and "mse"
+        """
+        round_number = 0
+        while num_rounds is None or round_number < num_rounds:
+            if round_number > 0 and step_size > 0:
+                self.move_robots(self.rng.normal(0, step_size, size=(self.num_robots, 2)))
+            # Each round takes its own measurements, shared by all of its phases
+            self.swarm.range_cache.invalidate()
+
+            if self.clusters > 1:
+                leaders = self.localize_clusters()
+                leader = self.robots[self.swarm.leader]
+                reference_robots = [self.robots[j] for j in self.swarm.reference.tolist()]
+                mse = self.calculate_mse()
+                yield {
+                    "round": round_number,
+                    "leader": leader.id,
+                    "leaders": [robot.id for robot in leaders],
+                    "reference": [robot.id for robot in reference_robots],
+                    "estimated_positions": self.estimated_positions.copy(),
+                    "mse": mse,
+                }
+                round_number += 1
+                continue
+
+            leader = self.leader_election()
+            reference_robots = self.select_reference_robots(leader)
+            if len(reference_robots) < 2:
+                # The leader cannot set up a frame; report the round as unlocalized
+                self.estimated_positions[:] = np.nan
+                self.swarm.localized[:] = False
+                mse = np.nan
+            else:
+                self.calculate_new_positions(leader, reference_robots)
+                mse = self.calculate_mse()
+
+            yield {
+                "round": round_number,
+                "leader": leader.id,
+                "leaders": [leader.id],
+                "reference": [robot.id for robot in reference_robots],
+                "estimated_positions": self.estimated_positions.copy(),
+                "mse": mse,
+            }
+            round_number += 1
 
 
     def plot_robots(self, iteration, leader_id, reference_robot_ids):
+        import matplotlib.pyplot as plt
         fig, ax = plt.subplots(1, 2, figsize=(12, 6), sharey=True)
     
         ax[0].set_title("Ground Truth Positions")
@@ -147,23 +504,119 @@ class Environment:
         plt.show()
 
 
-num_robots = 15
-std_noise = 0.0000001
-num_iterations = 5
+def _localize_cluster(positions, rows, cols, ranges, leader, std_noise, options, seed):
+    # Builds one cluster's frame from its own neighbor graph, reusing the ranges already measured
+    env = Environment(positions.shape[0], std_noise, rng=np.random.default_rng(seed), **options)
+    env.swarm = SwarmState(positions, std_noise, env.neighbor_radius, "rb", env.rng)
+    env.swarm.set_neighbors(rows, cols, ranges)
+    env.swarm.range_cache.record(rows, cols, ranges)
+    env.swarm.leader = leader
+
+    reference_robots = env.select_reference_robots(env.robots[leader])
+    if len(reference_robots) < 2:
+        return np.full((env.num_robots, 2), np.nan), np.zeros(env.num_robots, dtype=bool), env.swarm.reference
+    env.calculate_new_positions(env.robots[leader], reference_robots)
+
+    return env.estimated_positions, env.swarm.localized, env.swarm.reference
+
+def run_trial(num_robots, std_noise, seed=None, **environment_options):
+    """Runs one independent localization trial without plotting.
 
-for i in range(num_iterations):
-    env = Environment(num_robots, std_noise)
+    num_robots: int (number of robots)
+    std_noise: double (standard deviation of the range noise)
+    seed: int or numpy SeedSequence (seed of the trial's random generator)
+
+    -> double (MSE of the trial, nan if the leader had fewer than two neighbors)
+    """
+    env = Environment(num_robots, std_noise, rng=np.random.default_rng(seed), **environment_options)
     env.initialize_robots()
 
-    leader = env.leader_election()
-    reference_robots = env.select_reference_robots(leader)
-    reference_robot_ids = [robot.id for robot in reference_robots]
+    return next(env.localization_rounds(1))["mse"]
+
+def _run_trial_batch(num_robots, std_noise, seeds, environment_options):
+    return [run_trial(num_robots, std_noise, seed, **environment_options) for seed in seeds]
+
+def run_trials(num_robots_values, std_noise_values, num_trials, seed=None, processes=None, **environment_options):
+    """Runs num_trials independent trials for every (num_robots, std_noise) pair
+    in parallel worker processes and aggregates their MSE distributions.
+
+    Every trial gets its own child of np.random.SeedSequence(seed), so results
+    do not depend on the number of processes or on how trials are batched.
+
+    num_robots_values: list of int (swarm sizes to sweep)
+    std_noise_values: list of double (noise levels to sweep)
+    num_trials: int (trials per grid point)
+    seed: int (root seed, None for fresh entropy)
+    processes: int (worker processes, None for one per core, 1 to run in this process)
+
+    Trials run in worker processes localize their clusters (clusters > 1)
+    in their own worker instead of opening a nested pool; trials run in
+    this process give their clusters up to processes workers.
+
+    -> dict mapping (num_robots, std_noise) to a dict of the per-trial "mse"
+       array and its "mean", "std", "median", "p5", "p95" and "failed" count
+    """
+    grid = [(n, s) for n in num_robots_values for s in std_noise_values]
+    grid_seeds = np.random.SeedSequence(seed).spawn(len(grid))
+
+    # A few batches per worker keeps every core busy without paying per-trial IPC
+    workers = processes or os.cpu_count() or 1
+    batch_size = max(1, -(-num_trials*len(grid) // (4*workers)))
+
+    # The cores are already shared out between trials, so pools must not nest
+    environment_options = dict(environment_options, processes=1 if workers > 1 else processes)
+
+    jobs = []
+    for (n, s), grid_seed in zip(grid, grid_seeds):
+        trial_seeds = grid_seed.spawn(num_trials)
+        for start in range(0, num_trials, batch_size):
+            jobs.append((n, s, trial_seeds[start:start + batch_size], environment_options))
+
+    if workers == 1:
+        batches = [_run_trial_batch(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            batches = list(executor.map(_run_trial_batch, *zip(*jobs)))
+
+    mse = {key: [] for key in grid}
+    for (n, s, _, _), batch in zip(jobs, batches):
+        mse[(n, s)].extend(batch)
+
+    results = {}
+    for key, values in mse.items():
+        values = np.array(values)
+        finite = values[np.isfinite(values)]
+        results[key] = {
+            "mse": values,
+            "mean": np.mean(finite) if finite.size else np.nan,
+            "std": np.std(finite) if finite.size else np.nan,
+            "median": np.median(finite) if finite.size else np.nan,
+            "p5": np.percentile(finite, 5) if finite.size else np.nan,
+            "p95": np.percentile(finite, 95) if finite.size else np.nan,
+            "failed": values.size - finite.size,
+        }
+
+    return results
+
+
+if __name__ == "__main__":
+    num_robots = 15
+    std_noise = 0.0000001
+    num_iterations = 5
+
+    for i in range(num_iterations):
+        env = Environment(num_robots, std_noise)
+        env.initialize_robots()
+
+        leader = env.leader_election()
+        reference_robots = env.select_reference_robots(leader)
+        reference_robot_ids = [robot.id for robot in reference_robots]
 
-    env.calculate_new_positions(leader, reference_robots)
-    mse = env.calculate_mse()
+        env.calculate_new_positions(leader, reference_robots)
+        mse = env.calculate_mse()
 
-    print(f"Iteration {i+1}:")
-    print(f"Mean Squared Error (MSE): {mse:.3f}")
-    print("Ground Truth Positions:", env.true_positions)
-    print("New Coordinate System Positions:", env.new_coordinate_positions)
-    env.plot_robots(i + 1, leader.id, reference_robot_ids)
\ No newline at end of file
+        print(f"Iteration {i+1}:")
+        print(f"Mean Squared Error (MSE): {mse:.3f}")
+        print("Ground Truth Positions:", env.true_positions)
+        print("New Coordinate System Positions:", env.new_coordinate_positions)
+        env.plot_robots(i + 1, leader.id, reference_robot_ids)
@@ -0,0 +1,99 @@
+import math
+
+import numpy as np
+
+from rps.robotarium_abc import RobotariumABC
+import rps.utilities.misc as misc
+from rps.utilities.simulation import (collision_counts, exceeds_actuator_limits, integrate_unicycles,
+                                      outside_boundaries, threshold_velocities)
+from rps.utilities.violations import ViolationAccumulator
+
+# BatchRobotarium steps B independent Robotarium scenarios of N robots each
+# as one simulator.  Poses are a Bx3xN array and velocities a Bx2xN array,
+# so a step is a few array operations regardless of B.  It is headless and
+# keeps the same per-scenario error counts as Robotarium._validate.
+
+class BatchRobotarium:
+
+    def __init__(self, number_of_environments, number_of_robots, initial_conditions=np.array([])):
+        #Check user input types
+        assert isinstance(number_of_environments, int), "The number of environments (number_of_environments) provided to create a BatchRobotarium must be an integer type. Recieved type %r." % type(number_of_environments).__name__
+        assert isinstance(number_of_robots, int), "The number of robots used argument (number_of_robots) provided to create a BatchRobotarium must be an integer type. Recieved type %r." % type(number_of_robots).__name__
+        assert isinstance(initial_conditions, np.ndarray), "The initial conditions array argument (initial_conditions) provided to create a BatchRobotarium must be a numpy ndarray. Recieved type %r." % type(initial_conditions).__name__
+
+        #Check user input ranges/sizes
+        assert number_of_environments > 0, "A BatchRobotarium needs at least one environment. Recieved %r." % number_of_environments
+        assert (number_of_robots >= 0 and number_of_robots <= 50), "Requested %r robots to be used when creating the BatchRobotarium. The deployed number of robots must be between 0 and 50." % number_of_robots
+        if (initial_conditions.size > 0):
+            assert initial_conditions.shape == (number_of_environments, 3, number_of_robots), "Initial conditions provided when creating a BatchRobotarium must be of size Bx3xN. Expected a %r x 3 x %r array but recieved an array of shape %r." % (number_of_environments, number_of_robots, initial_conditions.shape)
+
+        self.number_of_environments = number_of_environments
+        self.number_of_robots = number_of_robots
+
+        # Boundary stuff -> lower left point / width / height
+        self.boundaries = [-1.6, -1, 3.2, 2]
+
+        if initial_conditions.size > 0:
+            self.poses = np.array(initial_conditions, dtype=float)
+        else:
+            self.poses = np.stack([misc.generate_initial_conditions(number_of_robots, spacing=0.2, width=2.5, height=1.5)
+                                   for _ in range(number_of_environments)])
+        self.velocities = np.zeros((number_of_environments, 2, number_of_robots))
+
+        # Error counts of every environment, as Robotarium._validate keeps them per robot
+        self.violations = ViolationAccumulator(number_of_robots, (number_of_environments,))
+
+        self._iterations = 0
+
+    # Physical constants are the single-robotarium ones
+    time_step = RobotariumABC.time_step
+    wheel_radius = RobotariumABC.wheel_radius
+    base_length = RobotariumABC.base_length
+    max_linear_velocity = RobotariumABC.max_linear_velocity
+    max_angular_velocity = RobotariumABC.max_angular_velocity
+    max_wheel_velocity = RobotariumABC.max_wheel_velocity
+    collision_offset = RobotariumABC.collision_offset
+    collision_diameter = RobotariumABC.collision_diameter
+
+    def get_poses(self):
+        """Returns the states of the agents of every environment.
+
+        -> Bx3xN numpy array (of robot poses)
+        """
+        return self.poses
+
+    def set_velocities(self, ids, velocities):
+        """Sets the velocities of every robot of every environment, clipped to
+        the linear and angular velocity limits as Robotarium.set_velocities does.
+
+        ids: numpy index array (unused, as in Robotarium.set_velocities)
+        velocities: Bx2xN numpy array (of linear and angular velocities)
+        """
+        assert velocities.shape == self.velocities.shape, "The velocities provided to a BatchRobotarium must be of size Bx2xN. Expected %r but recieved %r." % (self.velocities.shape, velocities.shape)
+
+        self.velocities[...] = velocities
+        threshold_velocities(self.velocities, self.max_linear_velocity, self.max_angular_velocity)
+
+    def step(self):
+        """Validates and then advances the dynamics of every environment."""
+        self._validate()
+        self._iterations += 1
+
+        integrate_unicycles(self.poses, self.velocities, self.time_step)
+
+    def _validate(self):
+        self.violations.record(outside_boundaries(self.poses, self.boundaries),
+                               collision_counts(self.poses, self.collision_offset, self.collision_diameter),
+                               exceeds_actuator_limits(self.velocities, self.wheel_radius, self.base_length, self.max_wheel_velocity))
+
+    def error_summary(self):
+        """Summarizes the errors of every environment the way
+        Robotarium.call_at_scripts_end reports them.
+
+        -> dict with "boundary" and "collision" (B numpy arrays of the worst
+           robot's count), "actuator" (B numpy array) and "seconds" (estimated
+           real seconds on the Robotarium)
+        """
+        summary = self.violations.summary()
+        summary["seconds"] = math.ceil(self._iterations*0.033)
+        return summary
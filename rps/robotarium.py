@@ -2,9 +2,8 @@ import math
 import time
 
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
 from rps.robotarium_abc import *
+from rps.utilities.simulation import integrate_unicycles
 
 # Robotarium This object provides routines to interface with the Robotarium.
 #
@@ -23,9 +22,6 @@ class Robotarium(RobotariumABC):
             self._called_step_already = True
             self._checked_poses_already = False
 
-            #Initialization of error collection.
-            self._errors = {}
-
             #Initialize steps
             self._iterations = 0 
 
@@ -49,16 +45,14 @@ class Robotarium(RobotariumABC):
             """
             print('##### DEBUG OUTPUT #####')
             print('Your simulation will take approximately {0} real seconds when deployed on the Robotarium. \n'.format(math.ceil(self._iterations*0.033)))
-            # TODO: check collision string and boundary string
-            if bool(self._errors):
-                if "boundary" in self._errors:
-                    boundary_violations = max(self._errors["boundary"].values())
-                    print('\t Simulation had {0} {1}\n'.format(boundary_violations, self._errors["boundary_string"]))
-                if "collision" in self._errors:
-                    collision_violations = max(self._errors["collision"].values())
-                    print('\t Simulation had {0} {1}\n'.format(collision_violations, self._errors["collision_string"]))
-                if "actuator" in self._errors:
-                    print('\t Simulation had {0} {1}'.format(self._errors["actuator"], self._errors["actuator_string"]))
+            errors = self.violations.summary()
+            if errors["boundary"] or errors["collision"] or errors["actuator"]:
+                if errors["boundary"]:
+                    print('\t Simulation had {0} {1}\n'.format(errors["boundary"], self.violations.boundary_string))
+                if errors["collision"]:
+                    print('\t Simulation had {0} {1}\n'.format(errors["collision"], self.violations.collision_string))
+                if errors["actuator"]:
+                    print('\t Simulation had {0} {1}'.format(errors["actuator"], self.violations.actuator_string))
             else:
                 print('No errors in your simulation! Acceptance of your experiment is likely!')
 
@@ -74,52 +68,21 @@ class Robotarium(RobotariumABC):
             self._checked_poses_already = False
 
             # Validate before thresholding velocities
-            self._errors = self._validate()
+            self._validate()
             self._iterations += 1
 
 
-            # Update dynamics of agents
-            self.poses[0, :] = self.poses[0, :] + self.time_step*np.cos(self.poses[2,:])*self.velocities[0, :]
-            self.poses[1, :] = self.poses[1, :] + self.time_step*np.sin(self.poses[2,:])*self.velocities[0, :]
-            self.poses[2, :] = self.poses[2, :] + self.time_step*self.velocities[1, :]
-            # Ensure angles are wrapped
-            self.poses[2, :] = np.arctan2(np.sin(self.poses[2, :]), np.cos(self.poses[2, :]))
+            # Update dynamics of agents in one fused pass; angles are wrapped to [-pi, pi)
+            integrate_unicycles(self.poses, self.velocities, self.time_step)
 
             # Update graphics
             if(self.show_figure):
                 if(self.sim_in_real_time):
-                    t = time.time()
-                    while(t - self.previous_render_time < self.time_step):
-                        t=time.time()
-                    self.previous_render_time = t
-
-                for i in range(self.number_of_robots):
-                    # self.chassis_patches[i].xy = self.poses[:2, i] + self.robot_radius*np.array((np.cos(self.poses[2, i]), np.sin(self.poses[2, i])))
-                    # if i == 0:
-                    #     print(self.poses[2, i] - math.pi/2)
-                    #     print('='*50)
-
-                    # self.chassis_patches[i].xy = self.poses[:2, i] + np.array(-self.robot_width/2 * np.sin(self.poses[2, i] + math.pi/2), self.robot_length/2 * np.cos(self.poses[2,i] + math.pi/2))
-                    self.chassis_patches[i].xy = self.poses[:2, i]+self.robot_length/2*np.array((np.cos(self.poses[2, i]+math.pi/2), np.sin(self.poses[2, i]+math.pi/2)))+\
-                                            0.04*np.array((-np.sin(self.poses[2, i]+math.pi/2), np.cos(self.poses[2, i]+math.pi/2)))  + self.robot_length/2*np.array((np.cos(self.poses[2, i]), np.sin(self.poses[2, i])))
-                    # self.chassis_patches[i].orientation = self.poses[2, i] + math.pi/4
-                    self.chassis_patches[i].angle = (self.poses[2, i] - math.pi/2) * 180/math.pi
-
-                    self.right_wheel_patches[i].center = self.poses[:2, i]+self.robot_length/2*np.array((np.cos(self.poses[2, i]+math.pi/2), np.sin(self.poses[2, i]+math.pi/2)))+\
-                                            0.04*np.array((-np.sin(self.poses[2, i]+math.pi/2), np.cos(self.poses[2, i]+math.pi/2)))  + self.robot_length/2*np.array((np.cos(self.poses[2, i]), np.sin(self.poses[2, i])))
-                    self.right_wheel_patches[i].orientation = self.poses[2, i] + math.pi/4
-
-                    self.left_wheel_patches[i].center = self.poses[:2, i]+self.robot_length/2*np.array((np.cos(self.poses[2, i]-math.pi/2), np.sin(self.poses[2, i]-math.pi/2)))+\
-                                            0.04*np.array((-np.sin(self.poses[2, i]+math.pi/2), np.cos(self.poses[2, i]+math.pi/2))) + self.robot_length/2*np.array((np.cos(self.poses[2, i]), np.sin(self.poses[2, i])))
-                    self.left_wheel_patches[i].orientation = self.poses[2,i] + math.pi/4
-                    
-                    self.right_led_patches[i].center = self.poses[:2, i]+0.75*self.robot_length/2*np.array((np.cos(self.poses[2,i]), np.sin(self.poses[2,i])))-\
-                                    0.04*np.array((-np.sin(self.poses[2, i]), np.cos(self.poses[2, i]))) + self.robot_length/2*np.array((np.cos(self.poses[2, i]), np.sin(self.poses[2, i])))
-                    self.left_led_patches[i].center = self.poses[:2, i]+0.75*self.robot_length/2*np.array((np.cos(self.poses[2,i]), np.sin(self.poses[2,i])))-\
-                                    0.015*np.array((-np.sin(self.poses[2, i]), np.cos(self.poses[2, i]))) + self.robot_length/2*np.array((np.cos(self.poses[2, i]), np.sin(self.poses[2, i])))
-                    # self.base_patches[i].center = self.poses[:2, i]
-                    
-
-                self.figure.canvas.draw_idle()
-                self.figure.canvas.flush_events()
+                    # Sleep off the rest of the time step instead of spinning on the clock
+                    remaining = self.time_step - (time.time() - self.previous_render_time)
+                    if remaining > 0:
+                        time.sleep(remaining)
+                    self.previous_render_time = time.time()
+
+                self.renderer.draw(self.poses)
 
@@ -1,12 +1,10 @@
-import time
-import math
 from abc import ABC, abstractmethod
 
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
 
 import rps.utilities.misc as misc
+from rps.utilities.simulation import collision_counts, exceeds_actuator_limits, outside_boundaries
+from rps.utilities.violations import ViolationAccumulator
 
 # RobotariumABC: This is an interface for the Robotarium class that
 # ensures the simulator and the robots match up properly.  
@@ -15,6 +13,22 @@ import rps.utilities.misc as misc
 
 class RobotariumABC(ABC):
 
+    # Constants (shared with BatchRobotarium)
+    time_step = 0.033
+    robot_diameter = 0.11
+    wheel_radius = 0.016
+    base_length = 0.105
+    max_linear_velocity = 0.2
+    max_angular_velocity = 2*(wheel_radius/robot_diameter)*(max_linear_velocity/wheel_radius)
+    max_wheel_velocity = max_linear_velocity/wheel_radius
+
+    robot_radius = robot_diameter/2
+    robot_length = 0.095
+    robot_width = 0.09
+
+    collision_offset = 0.025 # May want to increase this
+    collision_diameter = 0.135
+
     def __init__(self, number_of_robots=-1, show_figure=True, sim_in_real_time=True, initial_conditions=np.array([])):
 
         #Check user input types
@@ -39,103 +53,49 @@ class RobotariumABC(ABC):
         self.file_path = None
         self.current_file_size = 0
 
-        # Constants
-        self.time_step = 0.033
-        self.robot_diameter = 0.11
-        self.wheel_radius = 0.016
-        self.base_length = 0.105
-        self.max_linear_velocity = 0.2
-        self.max_angular_velocity = 2*(self.wheel_radius/self.robot_diameter)*(self.max_linear_velocity/self.wheel_radius)
-        self.max_wheel_velocity = self.max_linear_velocity/self.wheel_radius
-
-        self.robot_radius = self.robot_diameter/2
-        self.robot_length = 0.095
-        self.robot_width = 0.09
-
-        self.collision_offset = 0.025 # May want to increase this
-        self.collision_diameter = 0.135
-
 
         self.velocities = np.zeros((2, number_of_robots))
         self.poses = self.initial_conditions
         if self.initial_conditions.size == 0:
             self.poses = misc.generate_initial_conditions(self.number_of_robots, spacing=0.2, width=2.5, height=1.5)
         
+        # Error counts of this simulator only
+        self.violations = ViolationAccumulator(self.number_of_robots)
+
         self.left_led_commands = []
         self.right_led_commands = []
 
         # Visualization
-        self.figure = []
-        self.axes = []
-        self.left_led_patches = []
-        self.right_led_patches = []
-        self.chassis_patches = []
-        self.right_wheel_patches = []
-        self.left_wheel_patches = []
-        self.base_patches = []
+        self.figure = None
+        self.axes = None
+        self.renderer = None
 
-        self.figure, self.axes = plt.subplots()
+        # Without a figure matplotlib is never imported, so headless runs stay cheap
         if(self.show_figure):
-            self.axes.set_axis_off()
-            for i in range(number_of_robots):
-                # p = patches.RegularPolygon((self.poses[:2, i]), 4, math.sqrt(2)*self.robot_radius, self.poses[2,i]+math.pi/4, facecolor='#FFD700', edgecolor = 'k')
-                p    = patches.Rectangle(
-                (
-                    self.poses[0, i] + self.robot_length / 2 * np.cos(self.poses[2, i] + math.pi / 2),
-                    self.poses[1, i] + self.robot_length / 2 * np.sin(self.poses[2, i] + math.pi / 2)
-                ),
-                self.robot_length,
-                self.robot_width,
-                angle=(self.poses[2, i] + math.pi / 4) * 180 / math.pi,
-                facecolor='#FFD700',
-                edgecolor='k'
-                )
-
-                rled = patches.Circle(self.poses[:2, i]+0.75*self.robot_length/2*np.array((np.cos(self.poses[2, i]), np.sin(self.poses[2, i]))+0.04*np.array((-np.sin(self.poses[2, i]+math.pi/2), np.cos(self.poses[2, i]+math.pi/2)))),
-                                       self.robot_length/2/5, fill=False)
-                lled = patches.Circle(self.poses[:2, i]+0.75*self.robot_length/2*np.array((np.cos(self.poses[2, i]), np.sin(self.poses[2, i]))+\
-                                        0.015*np.array((-np.sin(self.poses[2, i]+math.pi/2), np.cos(self.poses[2, i]+math.pi/2)))),\
-                                       self.robot_length/2/5, fill=False)
-                rw = patches.Circle(self.poses[:2, i]+self.robot_length/2*np.array((np.cos(self.poses[2, i]+math.pi/2), np.sin(self.poses[2, i]+math.pi/2)))+\
-                                                0.04*np.array((-np.sin(self.poses[2, i]+math.pi/2), np.cos(self.poses[2, i]+math.pi/2))),\
-                                                0.02, facecolor='k')
-                lw = patches.Circle(self.poses[:2, i]+self.robot_length/2*np.array((np.cos(self.poses[2, i]-math.pi/2), np.sin(self.poses[2, i]-math.pi/2)))+\
-                                                0.04*np.array((-np.sin(self.poses[2, i]+math.pi/2))),\
-                                                0.02, facecolor='k')
-
-                # base = patches.Circle(self.poses[:2, i], self.robot_radius/5, facecolor='r')
-
-                #lw = patches.RegularPolygon(self.poses[:2, i]+self.robot_radius*np.array((np.cos(self.poses[2, i]-math.pi/2), np.sin(self.poses[2, i]-math.pi/2)))+\
-                #                                0.035*np.array((-np.sin(self.poses[2, i]+math.pi/2), np.cos(self.poses[2, i]+math.pi/2))),\
-                #                                4, math.sqrt(2)*0.02, self.poses[2,i]+math.pi/4, facecolor='k')
-
-                self.chassis_patches.append(p)
-                self.left_led_patches.append(lled)
-                self.right_led_patches.append(rled)
-                self.right_wheel_patches.append(rw)
-                self.left_wheel_patches.append(lw)
-                # self.base_patches.append(base)
-
-                self.axes.add_patch(rw)
-                self.axes.add_patch(lw)
-                self.axes.add_patch(p)
-                self.axes.add_patch(lled)
-                self.axes.add_patch(rled)
-                # self.axes.add_patch(base)
-
-            # Draw arena
-            self.boundary_patch = self.axes.add_patch(patches.Rectangle(self.boundaries[:2], self.boundaries[2], self.boundaries[3], fill=False))
-
-            self.axes.set_xlim(self.boundaries[0]-0.1, self.boundaries[0]+self.boundaries[2]+0.1)
-            self.axes.set_ylim(self.boundaries[1]-0.1, self.boundaries[1]+self.boundaries[3]+0.1)
-
-            plt.ion()
-            plt.show()
-
-            plt.subplots_adjust(left=-0.03, right=1.03, bottom=-0.03, top=1.03, wspace=0, hspace=0)
-        else:
-            self.figure.set_visible(False)
-            plt.draw()
+            self._create_figure()
+
+    def _create_figure(self):
+        import matplotlib.pyplot as plt
+        import matplotlib.patches as patches
+
+        from rps.utilities.rendering import RobotRenderer
+
+        self.figure, self.axes = plt.subplots()
+        self.axes.set_axis_off()
+
+        # Draw arena
+        self.boundary_patch = self.axes.add_patch(patches.Rectangle(self.boundaries[:2], self.boundaries[2], self.boundaries[3], fill=False))
+
+        self.axes.set_xlim(self.boundaries[0]-0.1, self.boundaries[0]+self.boundaries[2]+0.1)
+        self.axes.set_ylim(self.boundaries[1]-0.1, self.boundaries[1]+self.boundaries[3]+0.1)
+
+        plt.ion()
+        plt.show()
+
+        plt.subplots_adjust(left=-0.03, right=1.03, bottom=-0.03, top=1.03, wspace=0, hspace=0)
+
+        # All robots are one collection, blitted over the arena when the backend allows it
+        self.renderer = RobotRenderer(self.axes, self.poses, self.robot_length, self.robot_width)
 
     def set_velocities(self, ids, velocities):
 
@@ -179,60 +139,10 @@ class RobotariumABC(ABC):
 
         return dxu
 
-    def _validate(self, errors = {}):
+    def _validate(self):
         # This is meant to be called on every iteration of step.
         # Checks to make sure robots are operating within the bounds of reality.
-
-        p = self.poses
-        b = self.boundaries
-        N = self.number_of_robots
-
-        for i in range(N):
-            x = p[0,i]
-            y = p[1,i]
-
-            if(x < b[0] or x > (b[0] + b[2]) or y < b[1] or y > (b[1] + b[3])):
-                    if "boundary" in errors:
-                        if i in errors["boundary"]:
-                            errors["boundary"][i] += 1
-                        else:
-                            errors["boundary"][i] = 1
-                            
-                    else:
-                        errors["boundary"] = {i: 1}
-                        errors["boundary_string"] = "iteration(s) robots were outside the boundaries."
-
-        for j in range(N-1):
-            for k in range(j+1,N):
-                first_position = p[:2, j] + self.collision_offset*np.array([np.cos(p[2,j]), np.sin(p[2, j])])
-                second_position = p[:2, k] + self.collision_offset*np.array([np.cos(p[2,k]), np.sin(p[2, k])])
-                if(np.linalg.norm(first_position - second_position) <= (self.collision_diameter)):
-                # if (np.linalg.norm(p[:2,j]-p[:2,k]) <= self.robot_diameter):
-                    if "collision" in errors:
-                        if j in errors["collision"]:
-                            errors["collision"][j] += 1
-                        else:
-                            errors["collision"][j] = 1
-                        # if k == N:
-                        if k in errors["collision"]:
-                            errors["collision"][k] += 1
-                        else:
-                            errors["collision"][k] = 1
-                    else:
-                        errors["collision"]= {j: 1}
-                        errors["collision"][k] = 1
-                        # if k == N:
-
-                        errors["collision_string"] = "iteration(s) where robots collided."
-
-        dxdd = self._uni_to_diff(self.velocities)
-        exceeding = np.absolute(dxdd) > self.max_wheel_velocity
-        if(np.any(exceeding)):
-            if "actuator" in errors:
-                errors["actuator"] += 1
-            else:
-                errors["actuator"] = 1
-                errors["actuator_string"] = "iteration(s) where the actuator limits were exceeded."
-
-        return errors
+        self.violations.record(outside_boundaries(self.poses, self.boundaries),
+                               collision_counts(self.poses, self.collision_offset, self.collision_diameter),
+                               exceeds_actuator_limits(self.velocities, self.wheel_radius, self.base_length, self.max_wheel_velocity))
 
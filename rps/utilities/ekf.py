@@ -0,0 +1,558 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+from rps.utilities.graph import ragged_ranges
+from rps.utilities.spatial import create_spatial_index
+
+# SwarmEKF runs the constant-velocity range EKF of EKF_algorithmic.ipynb for a
+# whole swarm at once.  Every robot's state [x, vx, y, vy] is a row of an Nx4
+# array and every covariance a slice of an Nx4x4 array, so a predict or a
+# round of range updates is a handful of batched array operations instead of
+# a Python loop over robots and measurements.
+
+def transition_matrix(dt):
+    """Builds the constant-velocity state transition over one time step.
+
+    dt: double (time step)
+
+    -> 4x4 numpy array
+    """
+    return np.array([[1, dt, 0, 0],
+                     [0, 1, 0, 0],
+                     [0, 0, 1, dt],
+                     [0, 0, 0, 1]], dtype=float)
+
+def other_robots(number_of_robots):
+    """Lists, for every robot, every other robot in index order.
+
+    number_of_robots: int
+
+    -> Nx(N-1) numpy index array
+    """
+    others = np.tile(np.arange(number_of_robots - 1), (number_of_robots, 1))
+    others += others >= np.arange(number_of_robots)[:, None]
+
+    return others
+
+def neighbor_table(positions, k=None, radius=None):
+    """Schedules which robots each robot measures: its k nearest robots, the
+    robots within radius, or the k nearest within radius.
+
+    positions: Nx2 numpy array (of x, y positions)
+    k: int (number of nearest robots, no limit if omitted)
+    radius: double (largest measured distance, no limit if omitted)
+
+    -> NxM numpy index array (of measured robots, -1 pads unused slots)
+    """
+    #Check user input types
+    assert isinstance(positions, np.ndarray), "In the neighbor_table function, the robot positions (positions) must be a numpy ndarray. Recieved type %r." % type(positions).__name__
+    #Check user input ranges/sizes
+    assert k is not None or radius is not None, "In the neighbor_table function, at least one of k and radius must be given."
+    assert k is None or k > 0, "In the neighbor_table function, the number of nearest robots (k) must be positive. Recieved %r." % k
+
+    number_of_robots = positions.shape[0]
+    if k is None:
+        first, second = create_spatial_index(positions, radius).query_pairs(radius)
+        return _padded_rows(np.concatenate((first, second)), np.concatenate((second, first)), number_of_robots)
+
+    k = min(k, number_of_robots - 1)
+    if k == 0:
+        return np.full((number_of_robots, 0), -1, dtype=np.int64)
+    upper_bound = np.inf if radius is None else radius*(1 + 1e-12)
+    _, nearest = cKDTree(positions).query(positions, k + 1, distance_upper_bound=upper_bound)
+    # Coincident robots may come back before the robot itself, so drop it by index
+    is_self = nearest == np.arange(number_of_robots)[:, None]
+    is_self[:, -1] |= ~is_self.any(axis=1)
+    nearest = nearest[~is_self].reshape(number_of_robots, k)
+    nearest[nearest == number_of_robots] = -1
+
+    return nearest
+
+def _padded_rows(rows, cols, number_of_robots):
+    # Turns directed pairs into a table with robot rows[k]'s columns in row rows[k]
+    order = np.lexsort((cols, rows))
+    rows, cols = rows[order], cols[order]
+    counts = np.bincount(rows, minlength=number_of_robots)
+    table = np.full((number_of_robots, counts.max(initial=0)), -1, dtype=np.int64)
+    table[rows, ragged_ranges(0, counts)] = cols
+
+    return table
+
+def round_robin(neighbors, count, step):
+    """Picks count of each robot's scheduled robots per step, cycling through
+    all of them over successive steps.
+
+    neighbors: NxM numpy index array (of measured robots, -1 pads unused slots)
+    count: int (measurements per robot per step)
+    step: int (step number)
+
+    -> Nxcount numpy index array (of measured robots, -1 pads unused slots)
+    """
+    available = np.count_nonzero(neighbors >= 0, axis=1)
+    slots = step*count + np.arange(count)
+    picked = np.take_along_axis(neighbors, slots % np.maximum(available, 1)[:, None], axis=1)
+    # Robots with fewer than count neighbors measure each of them once
+    picked[np.arange(count) >= available[:, None]] = -1
+
+    return picked
+
+def select_most_informative(neighbors, scores, count):
+    """Keeps each robot's count highest scoring measurements, best first.
+
+    neighbors: NxM numpy index array (of measured robots, -1 pads unused slots)
+    scores: NxM numpy array (e.g. SwarmEKF.information_gain)
+    count: int (measurements per robot)
+
+    -> Nxcount numpy index array (of measured robots, -1 pads unused slots)
+    """
+    count = min(count, neighbors.shape[1])
+    if count == 0:
+        return np.full((neighbors.shape[0], 0), -1, dtype=np.int64)
+
+    scores = np.where(neighbors >= 0, scores, -np.inf)
+    best = np.argpartition(-scores, count - 1, axis=1)[:, :count]
+    best = np.take_along_axis(best, np.argsort(-np.take_along_axis(scores, best, axis=1), axis=1), axis=1)
+
+    return np.take_along_axis(neighbors, best, axis=1)
+
+def measurement_rows(positions, neighbors):
+    """Linearizes the range from every robot to each of its scheduled robots:
+    its row of H is the unit bearing to the other robot, as in
+    Robot.make_measurements.
+
+    positions: Nx2 numpy array (of true x, y positions)
+    neighbors: NxM numpy index array (of measured robots, -1 pads unused slots)
+
+    -> tuple of NxM numpy array (of true distances, 0 in unused slots), NxMx4
+       numpy array (of measurement rows H, 0 in unused slots) and NxM boolean
+       numpy array (True where a slot holds a measurement)
+    """
+    #Check user input types
+    assert isinstance(positions, np.ndarray), "In the measurement_rows function, the robot positions (positions) must be a numpy ndarray. Recieved type %r." % type(positions).__name__
+    #Check user input ranges/sizes
+    assert positions.ndim == 2 and positions.shape[1] == 2, "In the measurement_rows function, the robot positions (positions) must be an Nx2 array. Recieved an array of shape %r." % (positions.shape,)
+    assert neighbors.ndim == 2 and neighbors.shape[0] == positions.shape[0], "In the measurement_rows function, the neighbors (neighbors) must be an NxM index array with one row per robot. Recieved an array of shape %r." % (neighbors.shape,)
+
+    mask = neighbors >= 0
+    offsets = positions[np.where(mask, neighbors, 0)] - positions[:, None, :]
+    distances = np.sqrt(np.einsum('nmi,nmi->nm', offsets, offsets))
+    distances[~mask] = 0
+
+    H = np.zeros(distances.shape + (4,))
+    bearings = offsets[mask]/distances[mask][:, None]
+    H[mask, 0] = bearings[:, 0]
+    H[mask, 2] = bearings[:, 1]
+
+    return distances, H, mask
+
+def range_measurements(positions, neighbors, std_noise, rng=None):
+    """Measures the range from every robot to each of its scheduled robots, as
+    Robot.make_measurements does: the range gets additive Gaussian noise and
+    its row of H is the unit bearing to the other robot.
+
+    positions: Nx2 numpy array (of true x, y positions)
+    neighbors: NxM numpy index array (of measured robots, -1 pads unused slots)
+    std_noise: double (standard deviation of the range noise)
+    rng: numpy Generator or the numpy.random module (source of the noise)
+
+    -> tuple of NxM numpy array (of ranges), NxMx4 numpy array (of measurement
+       rows H) and NxM boolean numpy array (True where a slot holds a measurement)
+    """
+    if rng is None:
+        rng = np.random
+
+    distances, H, mask = measurement_rows(positions, neighbors)
+    ranges = distances + rng.normal(0, std_noise, distances.shape)
+    ranges[~mask] = 0
+
+    return ranges, H, mask
+
+
+class ConstantVelocityFilter:
+    """Base of the swarm filters of the constant-velocity model: subclasses
+    keep an Nx4 states array ([x, vx, y, vy] per robot) and share its
+    position view and the transition matrices of each time step.
+    """
+
+    def __init__(self, number_of_robots, std_noise):
+        self.number_of_robots = number_of_robots
+        self.std_noise = std_noise
+        # Transition matrices are built once per distinct time step
+        self._transitions = {}
+
+    @property
+    def positions(self):
+        """Estimated x, y positions as an Nx2 array."""
+        return self.states[:, [0, 2]]
+
+    def transition(self, dt):
+        if dt not in self._transitions:
+            self._transitions[dt] = transition_matrix(dt)
+        return self._transitions[dt]
+
+
+class GaussianSwarmFilter(ConstantVelocityFilter):
+    """Base of the swarm filters that keep a mean and an Nx4x4 covariance per
+    robot; the motion model is linear, so their predict is the Kalman predict.
+    """
+
+    def __init__(self, positions, std_noise, initial_variance):
+        super().__init__(positions.shape[0], std_noise)
+
+        self.states = np.zeros((self.number_of_robots, 4))
+        self.states[:, 0] = positions[:, 0]
+        self.states[:, 2] = positions[:, 1]
+        self.covariances = np.tile(np.eye(4)*initial_variance, (self.number_of_robots, 1, 1))
+
+        self.process_noise = np.eye(4)*std_noise**2
+        self.measurement_noise = std_noise**2
+
+    def predict(self, dt):
+        """Propagates every state and covariance over one time step.
+
+        dt: double (time step)
+        """
+        F = self.transition(dt)
+        self.states = self.states @ F.T
+        self.covariances = F @ self.covariances @ F.T
+        self.covariances += self.process_noise
+
+
+class SwarmEKF(GaussianSwarmFilter):
+    """Constant-velocity EKF for every robot of a swarm, stored as arrays.
+
+    states is Nx4 ([x, vx, y, vy] per robot) and covariances is Nx4x4.  Each
+    robot is filtered independently; only the array layout is shared.
+
+    The update form picks how range measurements are folded in:
+    "standard" applies them one at a time with P = (I - K h) P, "joseph"
+    applies them one at a time with the Joseph form, which keeps every
+    covariance symmetric and positive semi-definite under rounding, and
+    "information" adds all of a robot's measurements to its information
+    matrix in one step (the measurements are linear in the state, so this is
+    the same estimate as applying them one at a time).
+
+    With an adaptive window W, every robot's R and Q are re-estimated after
+    each update by covariance matching over its last W updates: R from the
+    mean of innovation^2 - h P h^T over its measurements, and Q from the mean
+    outer product of the state corrections K*innovation.  std_noise then only
+    sets the starting values.
+    """
+
+    def __init__(self, positions, std_noise, initial_variance=100, update_form="standard", adaptive_window=None, minimum_variance=1e-8):
+        #Check user input types
+        assert isinstance(positions, np.ndarray), "The robot positions (positions) provided to create a SwarmEKF must be a numpy ndarray. Recieved type %r." % type(positions).__name__
+        #Check user input ranges/sizes
+        assert positions.ndim == 2 and positions.shape[1] == 2, "The robot positions (positions) provided to create a SwarmEKF must be an Nx2 array. Recieved an array of shape %r." % (positions.shape,)
+        assert initial_variance > 0, "The initial variance (initial_variance) of a SwarmEKF must be positive. Recieved %r." % initial_variance
+        assert update_form in ("standard", "joseph", "information"), "The update form (update_form) of a SwarmEKF must be one of 'standard', 'joseph' or 'information'. Recieved %r." % update_form
+        assert update_form != "information" or std_noise > 0, "The information update form of a SwarmEKF needs a positive range noise (std_noise). Recieved %r." % std_noise
+        assert adaptive_window is None or adaptive_window > 0, "The adaptive window (adaptive_window) of a SwarmEKF must be positive. Recieved %r." % adaptive_window
+
+        super().__init__(positions, std_noise, initial_variance)
+        self.update_form = update_form
+
+        self.adaptive_window = adaptive_window
+        self.minimum_variance = minimum_variance
+        if adaptive_window is not None:
+            # Per-robot Q (Nx4x4) and R (N), and the last W samples of each
+            self.process_noise = np.tile(self.process_noise, (self.number_of_robots, 1, 1))
+            self.measurement_noise = np.full(self.number_of_robots, self.measurement_noise)
+            self._excess_samples = np.full((adaptive_window, self.number_of_robots), np.nan)
+            self._correction_samples = np.zeros((adaptive_window, self.number_of_robots, 4, 4))
+            self._adaptive_updates = 0
+
+    def _measurement_variances(self):
+        return np.broadcast_to(self.measurement_noise, (self.number_of_robots,))
+
+    def information_gain(self, H):
+        """Scores candidate measurements by how much each alone would shrink
+        its robot's uncertainty: 0.5*log(1 + h P h^T / R).
+
+        H: NxMx4 numpy array (of measurement rows, 0 in unused slots)
+
+        -> NxM numpy array (of information gains in nats)
+        """
+        variances = np.einsum('nmi,nij,nmj->nm', H, self.covariances, H)
+        R = self._measurement_variances()[:, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(R > 0, 0.5*np.log1p(variances/R), np.where(variances > 0, np.inf, 0))
+
+    def update(self, ranges, H, mask=None):
+        """Folds in scalar range measurements with the filter's update form.
+        The sequential forms apply every robot's m-th measurement in the same
+        batched step, in the order Robot.update applies its measurement list.
+
+        ranges: NxM numpy array (of measured ranges)
+        H: NxMx4 numpy array (of measurement rows)
+        mask: NxM boolean numpy array (False skips a slot, all True if omitted)
+        """
+        assert ranges.shape == H.shape[:2] and ranges.shape[0] == self.number_of_robots, "In SwarmEKF.update, ranges must be NxM and H NxMx4 for the %r robots of the filter. Recieved shapes %r and %r." % (self.number_of_robots, ranges.shape, H.shape)
+
+        if mask is None:
+            mask = np.ones(ranges.shape, dtype=bool)
+        else:
+            H = np.where(mask[..., None], H, 0)
+            ranges = np.where(mask, ranges, 0)
+
+        prior_states = self.states.copy()
+        if self.update_form == "information":
+            excess = self._information_update(ranges, H)
+        else:
+            excess = self._sequential_update(ranges, H, self.update_form == "joseph")
+
+        if self.adaptive_window is not None:
+            self._adapt(self.states - prior_states, np.where(mask, excess, 0).sum(axis=1), np.count_nonzero(mask, axis=1))
+
+    def _sequential_update(self, ranges, H, joseph):
+        # -> NxM innovation^2 - h P h^T of every measurement, for covariance matching
+        states, covariances = self.states, self.covariances
+        R = self._measurement_variances()
+        gain = np.zeros((self.number_of_robots, 4))
+        identity = np.eye(4)
+        excess = np.empty(ranges.shape)
+        for m in range(ranges.shape[1]):
+            h = H[:, m]
+            Ph = np.einsum('nij,nj->ni', covariances, h)
+            S = np.einsum('ni,ni->n', h, Ph) + R
+            # The innovation is scalar, so the gain is a division rather than an inverse.
+            # Skipped slots have h = 0, so with noise-free ranges S can be 0
+            np.divide(Ph, S[:, None], out=gain, where=S[:, None] > 0)
+            gain[S <= 0] = 0
+
+            innovation = ranges[:, m] - np.einsum('ni,ni->n', h, states)
+            excess[:, m] = innovation*innovation - (S - R)
+            states += gain*innovation[:, None]
+            if joseph:
+                # P = (I - K h) P (I - K h)^T + K R K^T
+                A = identity - gain[:, :, None]*h[:, None, :]
+                covariances = A @ covariances @ A.transpose(0, 2, 1)
+                covariances += R[:, None, None]*gain[:, :, None]*gain[:, None, :]
+            else:
+                hP = np.einsum('ni,nij->nj', h, covariances)
+                covariances -= gain[:, :, None]*hP[:, None, :]
+
+        self.covariances = covariances
+        return excess
+
+    def _information_update(self, ranges, H):
+        # Y = P^-1 and y = Y x; each measurement adds h h^T / R and h z / R
+        R = self._measurement_variances()
+        innovations = ranges - np.einsum('nmi,ni->nm', H, self.states)
+        excess = innovations*innovations - np.einsum('nmi,nij,nmj->nm', H, self.covariances, H)
+
+        information = np.linalg.inv(self.covariances)
+        vector = np.einsum('nij,nj->ni', information, self.states)
+        information += np.einsum('nmi,nmj->nij', H, H)/R[:, None, None]
+        vector += np.einsum('nmi,nm->ni', H, ranges)/R[:, None]
+
+        self.covariances = np.linalg.inv(information)
+        self.states = np.einsum('nij,nj->ni', self.covariances, vector)
+        return excess
+
+    def _adapt(self, corrections, excess, counts):
+        # Windowed covariance matching; a robot's estimates only change once it has W samples
+        slot = self._adaptive_updates % self.adaptive_window
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self._excess_samples[slot] = np.where(counts > 0, excess/counts, np.nan)
+        self._correction_samples[slot] = corrections[:, :, None]*corrections[:, None, :]
+        self._adaptive_updates += 1
+        if self._adaptive_updates < self.adaptive_window:
+            return
+
+        measured = np.isfinite(self._excess_samples).any(axis=0)
+        R = np.nanmean(self._excess_samples[:, measured], axis=0)
+        self.measurement_noise[measured] = np.maximum(R, self.minimum_variance)
+        self.process_noise = self._correction_samples.mean(axis=0) + self.minimum_variance*np.eye(4)
+
+    def checkpoint_arrays(self):
+        """Everything restore needs to continue the filter exactly, including
+        the adaptive noise estimates and their sample windows.
+
+        -> dict mapping name to numpy array
+        """
+        arrays = {"states": self.states, "covariances": self.covariances}
+        if self.adaptive_window is not None:
+            arrays["measurement_noise"] = self.measurement_noise
+            arrays["process_noise"] = self.process_noise
+            arrays["excess_samples"] = self._excess_samples
+            arrays["correction_samples"] = self._correction_samples
+            arrays["adaptive_updates"] = np.array(self._adaptive_updates)
+        return arrays
+
+    def restore(self, arrays):
+        """Continues from arrays returned by checkpoint_arrays.
+
+        arrays: dict mapping name to numpy array
+        """
+        self.states = np.array(arrays["states"], dtype=float)
+        self.covariances = np.array(arrays["covariances"], dtype=float)
+        if self.adaptive_window is not None:
+            assert "adaptive_updates" in arrays, "The checkpoint restored into an adaptive SwarmEKF has no adaptive noise state. Recieved arrays %r." % sorted(arrays)
+            self.measurement_noise = np.array(arrays["measurement_noise"], dtype=float)
+            self.process_noise = np.array(arrays["process_noise"], dtype=float)
+            self._excess_samples = np.array(arrays["excess_samples"], dtype=float)
+            self._correction_samples = np.array(arrays["correction_samples"], dtype=float)
+            self._adaptive_updates = int(arrays["adaptive_updates"])
+
+
+def _conflict_free_rounds(first, second, number_of_robots):
+    """Splits a measurement sequence into rounds in which no robot appears
+    twice.  A measurement goes into a round once every earlier measurement of
+    both its robots is in an earlier round, so every robot still sees its
+    measurements in sequence order.
+
+    -> K numpy array (of round numbers)
+    """
+    rounds = np.full(first.size, -1, dtype=np.int64)
+    remaining = np.arange(first.size)
+    round_number = 0
+    while remaining.size:
+        a, b = first[remaining], second[remaining]
+        earliest = np.full(number_of_robots, first.size, dtype=np.int64)
+        np.minimum.at(earliest, a, remaining)
+        np.minimum.at(earliest, b, remaining)
+        ready = (earliest[a] == remaining) & (earliest[b] == remaining)
+        rounds[remaining[ready]] = round_number
+        remaining = remaining[~ready]
+        round_number += 1
+
+    return rounds
+
+
+class CooperativeEKF(GaussianSwarmFilter):
+    """Constant-velocity EKF over the joint state of a swarm, where every range
+    couples the states of the two robots it connects.
+
+    The joint covariance is stored sparsely: the Nx4x4 diagonal blocks, plus
+    for every ordered pair (i, k) of the measurement graph a 4x4 factor
+    sigma_ik with P_ik = sigma_ik sigma_ki^T, so memory grows with the number
+    of pairs instead of N^2.  A range between robots a and b runs an exact
+    EKF update on the joint 8-dimensional state of a and b, then only touches
+    data the two robots own: their states, diagonal blocks and factors.
+    Their factors with third robots are rescaled by P' P^-1 of their own
+    block, which carries the update over to those correlations without
+    touching the third robots (the pairwise scheme of Luft et al., 2018).
+    Ranges are linearized at the current estimates.
+    """
+
+    def __init__(self, positions, std_noise, first, second, initial_variance=100):
+        #Check user input types
+        assert isinstance(positions, np.ndarray), "The robot positions (positions) provided to create a CooperativeEKF must be a numpy ndarray. Recieved type %r." % type(positions).__name__
+        #Check user input ranges/sizes
+        assert positions.ndim == 2 and positions.shape[1] == 2, "The robot positions (positions) provided to create a CooperativeEKF must be an Nx2 array. Recieved an array of shape %r." % (positions.shape,)
+        assert initial_variance > 0, "The initial variance (initial_variance) of a CooperativeEKF must be positive. Recieved %r." % initial_variance
+
+        super().__init__(positions, std_noise, initial_variance)
+
+        # Both orders of every pair of the measurement graph, sorted by owner*N + other,
+        # so robot i's factors are factors[factor_indptr[i]:factor_indptr[i+1]]
+        first = np.asarray(first, dtype=np.int64)
+        second = np.asarray(second, dtype=np.int64)
+        keys = np.unique(np.concatenate((first*self.number_of_robots + second, second*self.number_of_robots + first)))
+        owners, others = np.divmod(keys, self.number_of_robots)
+        self.factor_keys = keys[owners != others]
+        self.factor_indptr = np.searchsorted(self.factor_keys//self.number_of_robots, np.arange(self.number_of_robots + 1))
+        # Robots start uncorrelated: sigma_ik = 0 for i < k and I for i > k
+        self.factors = np.zeros((self.factor_keys.size, 4, 4))
+        owners, others = np.divmod(self.factor_keys, self.number_of_robots)
+        self.factors[owners > others] = np.eye(4)
+
+    def cross_covariances(self, first, second):
+        """Rebuilds the cross-covariance blocks of the given pairs.
+
+        first: K numpy index array (of robots)
+        second: K numpy index array (of other robots, each a graph neighbor of first)
+
+        -> Kx4x4 numpy array (of P_first,second)
+        """
+        return self.factors[self.factor_slots(first, second)] @ self.factors[self.factor_slots(second, first)].transpose(0, 2, 1)
+
+    def factor_slots(self, owners, others):
+        keys = np.asarray(owners, dtype=np.int64)*self.number_of_robots + others
+        slots = np.searchsorted(self.factor_keys, keys)
+        assert np.array_equal(self.factor_keys[np.minimum(slots, self.factor_keys.size - 1)], keys), "In CooperativeEKF, every measured pair must be one of the pairs the filter was created with."
+
+        return slots
+
+    def predict(self, dt):
+        """Propagates every state, diagonal block and factor over one time step.
+
+        dt: double (time step)
+        """
+        super().predict(dt)
+        # Process noise is independent between robots, so P_ik only picks up F_i and F_k
+        self.factors = self.transition(dt) @ self.factors
+
+    def update(self, neighbors, ranges, mask=None):
+        """Applies range measurements between robots in table order: robot n's
+        m-th range is to robot neighbors[n, m], and all of robot 0's ranges
+        come before robot 1's.  Ranges between disjoint pairs of robots are
+        applied together in one batched step.
+
+        neighbors: NxM numpy index array (of measured robots, -1 pads unused slots)
+        ranges: NxM numpy array (of measured ranges)
+        mask: NxM boolean numpy array (False skips a slot, all True if omitted)
+        """
+        assert neighbors.shape == ranges.shape and neighbors.shape[0] == self.number_of_robots, "In CooperativeEKF.update, neighbors and ranges must both be NxM for the %r robots of the filter. Recieved shapes %r and %r." % (self.number_of_robots, neighbors.shape, ranges.shape)
+
+        valid = neighbors >= 0
+        if mask is not None:
+            valid &= mask
+        measuring, slot = np.nonzero(valid)
+        measured = neighbors[measuring, slot]
+        measured_ranges = ranges[measuring, slot]
+
+        # Each pair is handled as (a, b) with a < b; the range is symmetric
+        a = np.minimum(measuring, measured)
+        b = np.maximum(measuring, measured)
+
+        rounds = _conflict_free_rounds(a, b, self.number_of_robots)
+        order = np.argsort(rounds, kind="stable")
+        bounds = np.searchsorted(rounds[order], np.arange(rounds.max(initial=-1) + 2))
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            batch = order[start:end]
+            self._pair_update(a[batch], b[batch], measured_ranges[batch])
+
+    def _pair_update(self, a, b, ranges):
+        # No robot appears twice in a, b, so every scatter below is conflict free
+        forward = self.factor_slots(a, b)
+        backward = self.factor_slots(b, a)
+        joint = np.empty((a.size, 8, 8))
+        joint[:, :4, :4] = self.covariances[a]
+        joint[:, 4:, 4:] = self.covariances[b]
+        joint[:, :4, 4:] = self.factors[forward] @ self.factors[backward].transpose(0, 2, 1)
+        joint[:, 4:, :4] = joint[:, :4, 4:].transpose(0, 2, 1)
+
+        offsets = self.states[b][:, [0, 2]] - self.states[a][:, [0, 2]]
+        predicted = np.sqrt(np.einsum('ki,ki->k', offsets, offsets))
+        # Coincident estimates have no bearing to linearize along; skip them
+        usable = predicted > 0
+        bearings = np.zeros_like(offsets)
+        bearings[usable] = offsets[usable]/predicted[usable, None]
+        h = np.zeros((a.size, 8))
+        h[:, [0, 2]] = -bearings
+        h[:, [4, 6]] = bearings
+
+        Ph = np.einsum('kij,kj->ki', joint, h)
+        S = np.einsum('ki,ki->k', h, Ph) + self.measurement_noise
+        gain = np.zeros_like(Ph)
+        np.divide(Ph, S[:, None], out=gain, where=(S[:, None] > 0) & usable[:, None])
+        innovation = np.where(usable, ranges - predicted, 0)
+
+        self.states[a] += gain[:, :4]*innovation[:, None]
+        self.states[b] += gain[:, 4:]*innovation[:, None]
+        # P - K S K^T, symmetric by construction
+        joint -= S[:, None, None]*gain[:, :, None]*gain[:, None, :]
+
+        for robots, updated in ((a, joint[:, :4, :4]), (b, joint[:, 4:, 4:])):
+            # sigma_ik <- P_ii' P_ii^-1 sigma_ik for every factor robot i owns
+            scaling = np.linalg.solve(self.covariances[robots], updated).transpose(0, 2, 1)
+            starts = self.factor_indptr[robots]
+            counts = self.factor_indptr[robots + 1] - starts
+            owned = ragged_ranges(starts, counts)
+            self.factors[owned] = np.repeat(scaling, counts, axis=0) @ self.factors[owned]
+            self.covariances[robots] = updated
+
+        self.factors[forward] = joint[:, :4, 4:]
+        self.factors[backward] = np.eye(4)
@@ -0,0 +1,216 @@
+import numpy as np
+
+from rps.utilities.ekf import ConstantVelocityFilter, GaussianSwarmFilter
+
+# Sampling-based alternatives to SwarmEKF for the constant-velocity range
+# model of EKF_algorithmic.ipynb.  Both keep every robot's filter in stacked
+# arrays and measure ranges to neighbors whose positions are given (treated
+# as known landmarks), with the exact nonlinear model |p_neighbor - p|
+# instead of a linearization.
+
+def neighbor_positions(positions, neighbors):
+    """Gathers the positions of every robot's scheduled robots.
+
+    positions: Nx2 numpy array (of x, y positions)
+    neighbors: NxM numpy index array (of measured robots, -1 pads unused slots)
+
+    -> NxMx2 numpy array (of positions, nan in unused slots)
+    """
+    gathered = positions[np.where(neighbors >= 0, neighbors, 0)]
+    gathered[neighbors < 0] = np.nan
+
+    return gathered
+
+def _predicted_ranges(samples, anchors):
+    # samples ...xSx4 states, anchors ...x2 -> ...xS ranges from each sample's position
+    dx = anchors[..., None, 0] - samples[..., 0]
+    dy = anchors[..., None, 1] - samples[..., 2]
+    return np.sqrt(dx*dx + dy*dy)
+
+
+class SwarmUKF(GaussianSwarmFilter):
+    """Unscented Kalman filter for every robot of a swarm, stored as arrays.
+
+    states is Nx4 ([x, vx, y, vy] per robot) and covariances is Nx4x4.  The
+    motion model is linear, so predict is the Kalman predict; each range is
+    applied by pushing the 9 sigma points of every robot through the range
+    function in one tensor operation.
+    """
+
+    def __init__(self, positions, std_noise, initial_variance=100, alpha=1, beta=2, kappa=0):
+        #Check user input types
+        assert isinstance(positions, np.ndarray), "The robot positions (positions) provided to create a SwarmUKF must be a numpy ndarray. Recieved type %r." % type(positions).__name__
+        #Check user input ranges/sizes
+        assert positions.ndim == 2 and positions.shape[1] == 2, "The robot positions (positions) provided to create a SwarmUKF must be an Nx2 array. Recieved an array of shape %r." % (positions.shape,)
+        assert initial_variance > 0, "The initial variance (initial_variance) of a SwarmUKF must be positive. Recieved %r." % initial_variance
+
+        super().__init__(positions, std_noise, initial_variance)
+
+        # Scaled sigma point weights for a 4 dimensional state
+        spread = alpha**2*(4 + kappa) - 4
+        self._scale = np.sqrt(4 + spread)
+        self._mean_weights = np.full(9, 1/(2*(4 + spread)))
+        self._mean_weights[0] = spread/(4 + spread)
+        self._covariance_weights = self._mean_weights.copy()
+        self._covariance_weights[0] += 1 - alpha**2 + beta
+
+    def sigma_points(self, indices=slice(None)):
+        """Builds the sigma points of the given robots (all of them by default).
+
+        indices: numpy index array (of robots)
+
+        -> Kx9x4 numpy array (mean, then mean plus and minus each scaled
+           column of the covariance's Cholesky factor)
+        """
+        means = self.states[indices, None, :]
+        columns = self._scale*np.linalg.cholesky(self.covariances[indices]).transpose(0, 2, 1)
+        return np.concatenate((means, means + columns, means - columns), axis=1)
+
+    def update(self, anchors, ranges, mask=None):
+        """Applies the ranges to known positions one slot at a time, every
+        robot's m-th range in the same batched step.
+
+        anchors: NxMx2 numpy array (of the measured robots' positions)
+        ranges: NxM numpy array (of measured ranges)
+        mask: NxM boolean numpy array (False skips a slot, all True if omitted)
+        """
+        assert ranges.shape == anchors.shape[:2] and ranges.shape[0] == self.number_of_robots, "In SwarmUKF.update, ranges must be NxM and anchors NxMx2 for the %r robots of the filter. Recieved shapes %r and %r." % (self.number_of_robots, ranges.shape, anchors.shape)
+
+        valid = np.isfinite(anchors).all(axis=2)
+        if mask is not None:
+            valid &= mask
+
+        for m in range(ranges.shape[1]):
+            active = np.flatnonzero(valid[:, m])
+            if active.size == 0:
+                continue
+            points = self.sigma_points(active)
+            predicted = _predicted_ranges(points, anchors[active, m])
+            mean = predicted @ self._mean_weights
+            deviation = predicted - mean[:, None]
+            S = (deviation*deviation) @ self._covariance_weights + self.measurement_noise
+            cross = np.einsum('s,ks,ksi->ki', self._covariance_weights, deviation, points - self.states[active, None, :])
+            gain = cross/S[:, None]
+
+            self.states[active] += gain*(ranges[active, m] - mean)[:, None]
+            self.covariances[active] -= S[:, None, None]*gain[:, :, None]*gain[:, None, :]
+
+
+class SwarmParticleFilter(ConstantVelocityFilter):
+    """Particle filter for every robot of a swarm, stored as arrays.
+
+    particles is NxPx4 and log_weights NxP.  The likelihood of every range
+    is added to the log weights of all robots' particles at once, and robots
+    whose effective sample size drops below half the particles are
+    systematically resampled together, then roughened so the resampled
+    copies spread out again.
+    """
+
+    def __init__(self, positions, std_noise, number_of_particles=1000, initial_variance=100, initial_velocity_variance=None, roughening=0.2, rng=None):
+        """
+        positions: Nx2 numpy array (of initial x, y positions)
+        std_noise: double (range and process noise standard deviation)
+        number_of_particles: int (particles per robot)
+        initial_variance: double (prior variance of the positions)
+        initial_velocity_variance: double (prior variance of the velocities, std_noise**2 if omitted)
+        roughening: double (jitter after resampling, relative to the spread of the particles)
+        rng: numpy Generator (random source, numpy.random if omitted)
+        """
+        #Check user input types
+        assert isinstance(positions, np.ndarray), "The robot positions (positions) provided to create a SwarmParticleFilter must be a numpy ndarray. Recieved type %r." % type(positions).__name__
+        #Check user input ranges/sizes
+        assert positions.ndim == 2 and positions.shape[1] == 2, "The robot positions (positions) provided to create a SwarmParticleFilter must be an Nx2 array. Recieved an array of shape %r." % (positions.shape,)
+        assert std_noise > 0, "A SwarmParticleFilter needs a positive range noise (std_noise) to weight its particles. Recieved %r." % std_noise
+        assert number_of_particles > 0, "The number of particles (number_of_particles) of a SwarmParticleFilter must be positive. Recieved %r." % number_of_particles
+        assert roughening >= 0, "The roughening (roughening) of a SwarmParticleFilter must not be negative. Recieved %r." % roughening
+
+        super().__init__(positions.shape[0], std_noise)
+        self.number_of_particles = number_of_particles
+        self.roughening = roughening
+        self.rng = np.random if rng is None else rng
+
+        if initial_velocity_variance is None:
+            initial_velocity_variance = std_noise**2
+
+        # Positions start around the given positions, velocities around rest
+        mean = np.zeros((self.number_of_robots, 1, 4))
+        mean[:, 0, 0] = positions[:, 0]
+        mean[:, 0, 2] = positions[:, 1]
+        spread = np.sqrt(np.array((initial_variance, initial_velocity_variance, initial_variance, initial_velocity_variance)))
+        self.particles = mean + spread*self.rng.standard_normal((self.number_of_robots, number_of_particles, 4))
+        self.log_weights = np.full((self.number_of_robots, number_of_particles), -np.log(number_of_particles))
+
+    @property
+    def weights(self):
+        """Normalized particle weights as an NxP array."""
+        weights = np.exp(self.log_weights - self.log_weights.max(axis=1, keepdims=True))
+        return weights/weights.sum(axis=1, keepdims=True)
+
+    @property
+    def states(self):
+        """Weighted mean state of every robot as an Nx4 array."""
+        return np.einsum('np,npi->ni', self.weights, self.particles)
+
+    def predict(self, dt):
+        """Moves every particle over one time step and adds process noise
+        whose variance grows with the step.
+
+        dt: double (time step)
+        """
+        self.particles = self.particles @ self.transition(dt).T
+        self.particles += self.std_noise*np.sqrt(dt)*self.rng.standard_normal(self.particles.shape)
+
+    def update(self, anchors, ranges, mask=None):
+        """Weights every particle by the likelihood of all its robot's ranges
+        to known positions, then resamples the robots that need it.
+
+        anchors: NxMx2 numpy array (of the measured robots' positions)
+        ranges: NxM numpy array (of measured ranges)
+        mask: NxM boolean numpy array (False skips a slot, all True if omitted)
+        """
+        assert ranges.shape == anchors.shape[:2] and ranges.shape[0] == self.number_of_robots, "In SwarmParticleFilter.update, ranges must be NxM and anchors NxMx2 for the %r robots of the filter. Recieved shapes %r and %r." % (self.number_of_robots, ranges.shape, anchors.shape)
+
+        valid = np.isfinite(anchors).all(axis=2)
+        if mask is not None:
+            valid &= mask
+
+        # The NxPxM residual tensor is built one slot at a time to bound memory
+        for m in np.flatnonzero(valid.any(axis=0)):
+            residuals = (ranges[:, m, None] - _predicted_ranges(self.particles, anchors[:, m]))/self.std_noise
+            self.log_weights -= np.where(valid[:, m, None], 0.5*residuals*residuals, 0)
+        self.log_weights -= self.log_weights.max(axis=1, keepdims=True)
+
+        weights = self.weights
+        effective = 1/np.einsum('np,np->n', weights, weights)
+        self.resample(np.flatnonzero(effective < self.number_of_particles/2), weights)
+
+    def resample(self, indices, weights=None):
+        """Systematically resamples the particles of the given robots.
+
+        indices: numpy index array (of robots)
+        weights: NxP numpy array (of normalized weights, computed if omitted)
+        """
+        if len(indices) == 0:
+            return
+        if weights is None:
+            weights = self.weights
+
+        # One offset per robot, spread over P evenly spaced positions; row r of the
+        # cumulative weights is shifted by r so a single searchsorted covers every robot
+        count = self.number_of_particles
+        cumulative = np.cumsum(weights[indices], axis=1)
+        cumulative[:, -1] = 1
+        cumulative += np.arange(len(indices))[:, None]
+        positions = (self.rng.uniform(0, 1, (len(indices), 1)) + np.arange(count))/count + np.arange(len(indices))[:, None]
+        chosen = np.searchsorted(cumulative.ravel(), positions.ravel(), side="right").reshape(len(indices), count) - np.arange(len(indices))[:, None]*count
+        np.minimum(chosen, count - 1, out=chosen)
+
+        resampled = np.take_along_axis(self.particles[indices], chosen[..., None], axis=1)
+        self.log_weights[indices] = -np.log(count)
+
+        # Roughening: jitter each dimension by a fraction of the resampled set's extent
+        # so duplicated particles separate again
+        if self.roughening > 0:
+            extent = resampled.max(axis=1, keepdims=True) - resampled.min(axis=1, keepdims=True)
+            resampled += self.roughening*extent*count**(-1/4)*self.rng.standard_normal(resampled.shape)
+        self.particles[indices] = resampled
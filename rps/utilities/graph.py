@@ -1,4 +1,6 @@
 import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
 
 def cycle_GL(N):
     """ Generates a graph Laplacian for a cycle graph
@@ -192,4 +194,134 @@ def delta_disk_neighbors(poses, agent, delta):
 
     within_distance = [np.linalg.norm(poses[:2,x]-poses[:2,agent])<=delta for x in agents]
     within_distance[agent] = False
-    return agents[within_distance]
\ No newline at end of file
+    return agents[within_distance]
+
+def partition_graph(indptr, indices, num_clusters):
+    """ Splits a neighbor graph into clusters of nearby robots, each with its own leader.
+
+    Cluster seeds are spread by farthest-first traversal over hop distance
+    (unreachable robots come first, so every connected component gets at
+    least one seed while seeds last), every robot joins its nearest seed in
+    hops, and each cluster then elects its highest-degree robot as leader.
+
+    indptr: N+1 numpy index array (CSR row pointers of the neighbor graph)
+    indices: K numpy index array (CSR neighbor indices)
+    num_clusters: int (number of clusters, at most N)
+
+    -> tuple of C numpy index array (leader of each cluster) and N numpy
+       index array (cluster of each robot, -1 for robots no seed reaches)
+    """
+    #Check user input types
+    assert isinstance(num_clusters, (int, np.integer)), "In the partition_graph function, the number of clusters (num_clusters) must be an integer. Recieved type %r." % type(num_clusters).__name__
+    #Check user input ranges/sizes
+    N = len(indptr) - 1
+    assert 0 < num_clusters <= max(N, 1), "In the partition_graph function, the number of clusters (num_clusters) must be between 1 and the number of robots %r. Recieved %r." % (N, num_clusters)
+
+    if N == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    graph = csr_matrix((np.ones(len(indices)), indices, indptr), shape=(N, N))
+    degrees = np.diff(indptr)
+
+    seeds = [int(np.argmax(degrees))]
+    hops = dijkstra(graph, directed=False, indices=seeds[0], unweighted=True)
+    for _ in range(num_clusters - 1):
+        # Farthest robot from every seed so far, highest degree among ties
+        farthest = np.flatnonzero(hops == hops.max())
+        seed = int(farthest[np.argmax(degrees[farthest])])
+        if hops[seed] == 0:
+            break
+        seeds.append(seed)
+        # Only robots closer to the new seed than to every old one change, and
+        # none of those is further from it than the farthest robot itself
+        np.minimum(hops, dijkstra(graph, directed=False, indices=seed, unweighted=True, limit=hops[seed]), out=hops)
+
+    _, _, sources = dijkstra(graph, directed=False, indices=seeds, unweighted=True, min_only=True, return_predecessors=True)
+    seed_labels = np.full(N, -1)
+    seed_labels[seeds] = np.arange(len(seeds))
+    labels = np.where(sources >= 0, seed_labels[np.maximum(sources, 0)], -1)
+
+    # Highest-degree robot of each cluster, lowest index among ties
+    order = np.lexsort((np.arange(N), -degrees, labels))
+    first = np.searchsorted(labels[order], np.arange(len(seeds)))
+    leaders = order[first]
+
+    return leaders, labels
+
+def ragged_ranges(starts, counts):
+    """ Concatenates the index ranges [starts[k], starts[k] + counts[k]), e.g.
+    the slots of several CSR rows in the order given.
+
+    starts: M numpy index array (or an int shared by every range, 0 for the
+            rank of each entry within its range)
+    counts: M numpy index array (of range lengths)
+
+    -> counts.sum() numpy index array
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    ends = np.cumsum(counts)
+    return np.arange(ends[-1] if ends.size else 0) + np.repeat(starts - ends + counts, counts)
+
+def _weighted_graph(indptr, indices, weights):
+    # Directed measurements i -> j and j -> i become one undirected edge at their mean range
+    N = len(indptr) - 1
+    weights = np.asarray(weights, dtype=float)
+    usable = np.isfinite(weights) & (weights > 0)
+    rows = np.repeat(np.arange(N), np.diff(indptr))[usable]
+    cols = np.asarray(indices)[usable]
+    weights = weights[usable]
+
+    total = csr_matrix((np.concatenate((weights, weights)), (np.concatenate((rows, cols)), np.concatenate((cols, rows)))), shape=(N, N))
+    count = csr_matrix((np.ones(2*rows.size), (np.concatenate((rows, cols)), np.concatenate((cols, rows)))), shape=(N, N))
+    total.data /= count.data
+    return total
+
+def graph_distances(indptr, indices, weights, sources=None):
+    """ Shortest-path distances along a neighbor graph whose edges are weighted
+    by measured ranges, e.g. to complete a partial range matrix.
+
+    indptr: N+1 numpy index array (CSR row pointers of the neighbor graph)
+    indices: K numpy index array (CSR neighbor indices)
+    weights: K numpy array (of measured ranges; nan edges are skipped)
+    sources: M numpy index array (of robots to measure from, all N by default)
+
+    -> MxN numpy array (of distances, inf between disconnected robots)
+    """
+    graph = _weighted_graph(indptr, indices, weights)
+    if sources is None:
+        return dijkstra(graph, directed=False)
+
+    return dijkstra(graph, directed=False, indices=np.asarray(sources))
+
+def farthest_point_landmarks(indptr, indices, weights, first, count):
+    """ Picks landmarks by max-min (farthest-first) traversal over graph distances.
+
+    Each landmark is the robot farthest along the graph from all landmarks
+    chosen so far, among the robots connected to the first one.
+
+    indptr: N+1 numpy index array (CSR row pointers of the neighbor graph)
+    indices: K numpy index array (CSR neighbor indices)
+    weights: K numpy array (of measured ranges; nan edges are skipped)
+    first: int (first landmark)
+    count: int (number of landmarks)
+
+    -> tuple of L numpy index array (of landmarks, L <= count when fewer robots
+       are connected) and LxN numpy array (of graph distances from each landmark)
+    """
+    #Check user input ranges/sizes
+    assert count > 0, "In the farthest_point_landmarks function, the number of landmarks (count) must be positive. Recieved %r." % count
+
+    graph = _weighted_graph(indptr, indices, weights)
+    landmarks = [int(first)]
+    distances = [dijkstra(graph, directed=False, indices=first)]
+    nearest = distances[0].copy()
+    reachable = np.isfinite(nearest)
+    for _ in range(count - 1):
+        candidate = int(np.argmax(np.where(reachable, nearest, -1)))
+        if nearest[candidate] <= 0:
+            break
+        landmarks.append(candidate)
+        distances.append(dijkstra(graph, directed=False, indices=candidate))
+        np.minimum(nearest, distances[-1], out=nearest)
+
+    return np.array(landmarks), np.array(distances)
@@ -0,0 +1,367 @@
+import numpy as np
+from scipy.sparse.linalg import eigsh
+
+
+def _three_anchor_solve(anchors, ranges):
+    # Differenced 2x2 system of triangulate_positions; anchors is 3x2 (shared)
+    # or Mx3x2 (one triple per robot), ranges is Mx3
+    squared_norms = np.sum(anchors**2, axis=-1)
+    squared_ranges = ranges**2
+    x1, x2, x3 = anchors[..., 0, 0], anchors[..., 1, 0], anchors[..., 2, 0]
+    y1, y2, y3 = anchors[..., 0, 1], anchors[..., 1, 1], anchors[..., 2, 1]
+
+    A = 2*x2 - 2*x1
+    B = 2*y2 - 2*y1
+    C = squared_ranges[:, 0] - squared_ranges[:, 1] - squared_norms[..., 0] + squared_norms[..., 1]
+    D = 2*x3 - 2*x2
+    E = 2*y3 - 2*y2
+    F = squared_ranges[:, 1] - squared_ranges[:, 2] - squared_norms[..., 1] + squared_norms[..., 2]
+
+    x = (C*E - F*B) / (E*A - B*D)
+    y = (C*D - A*F) / (B*D - A*E)
+
+    return np.column_stack((x, y))
+
+
+def multilaterate(anchors, ranges, method="closed_form"):
+    """Estimates the positions of many robots from their ranges to shared anchors.
+
+    "closed_form" uses exactly three anchors and the same pairwise-differenced
+    2x2 system as Environment.triangulate_positions, solved for every robot at
+    once.  "lstsq" differences every anchor against the first one and solves
+    the overdetermined system in the least-squares sense, so any number of
+    anchors (three or more) can be used.
+
+    anchors: Kx2 numpy array (of anchor x, y positions)
+    ranges: MxK numpy array (of ranges from each robot to each anchor)
+    method: string ("closed_form" or "lstsq")
+
+    -> Mx2 numpy array (of estimated x, y positions)
+    """
+    #Check user input types
+    assert isinstance(anchors, np.ndarray), "In the multilaterate function, the anchor positions (anchors) must be a numpy ndarray. Recieved type %r." % type(anchors).__name__
+    assert isinstance(ranges, np.ndarray), "In the multilaterate function, the anchor ranges (ranges) must be a numpy ndarray. Recieved type %r." % type(ranges).__name__
+
+    #Check user input ranges/sizes
+    assert method in ("closed_form", "lstsq"), "In the multilaterate function, the method must be 'closed_form' or 'lstsq'. Recieved %r." % method
+    assert anchors.ndim == 2 and anchors.shape[1] == 2, "In the multilaterate function, the anchor positions (anchors) must be a Kx2 array. Recieved an array of shape %r." % (anchors.shape,)
+    assert ranges.ndim == 2 and ranges.shape[1] == anchors.shape[0], "In the multilaterate function, the ranges must be an MxK array with one column per anchor. Recieved %r anchors and a range array of shape %r." % (anchors.shape[0], ranges.shape)
+    assert anchors.shape[0] >= 3, "In the multilaterate function, at least three anchors are needed to localize in 2D. Recieved %r." % anchors.shape[0]
+    if method == "closed_form":
+        assert anchors.shape[0] == 3, "In the multilaterate function, the closed_form method uses exactly three anchors. Recieved %r; use method='lstsq' for more." % anchors.shape[0]
+
+    squared_norms = np.sum(anchors**2, axis=1)
+    squared_ranges = ranges**2
+
+    if method == "closed_form":
+        return _three_anchor_solve(anchors, ranges)
+
+    # Every robot shares the same design matrix, so one solve handles all of them
+    design = 2*(anchors[1:] - anchors[0])
+    targets = squared_ranges[:, [0]] - squared_ranges[:, 1:] - squared_norms[0] + squared_norms[1:]
+    solution = np.linalg.lstsq(design, targets.T, rcond=None)[0]
+
+    return solution.T
+
+def _linear_multilaterate(anchors, ranges, weights):
+    # Treats |p|^2 as a third unknown so every robot's anchors give a linear
+    # system; solved for all robots at once through batched 3x3 normal equations
+    K = anchors.shape[-2]
+    targets = ranges**2 - np.sum(anchors**2, axis=-1)
+    if anchors.ndim == 2:
+        design = np.column_stack((-2*anchors, np.ones(K)))
+        normal = (weights @ (design[:, :, np.newaxis]*design[:, np.newaxis, :]).reshape(K, 9)).reshape(-1, 3, 3)
+        moment = (weights*targets) @ design
+    else:
+        design = np.concatenate((-2*anchors, np.ones(anchors.shape[:2] + (1,))), axis=2)
+        normal = np.einsum('mk,mki,mkj->mij', weights, design, design)
+        moment = np.einsum('mk,mki->mi', weights*targets, design)
+    solution = np.einsum('mij,mj->mi', np.linalg.pinv(normal), moment)
+
+    return solution[:, :2]
+
+def _robust_scale(residuals, mask):
+    # Per-robot median absolute deviation of the used residuals, as a standard deviation
+    absolute = np.sort(np.where(mask, np.abs(residuals), np.inf), axis=1)
+    count = np.count_nonzero(mask, axis=1)
+    rows = np.arange(absolute.shape[0])
+    lower = absolute[rows, np.maximum(count - 1, 0)//2]
+    upper = absolute[rows, np.minimum(count//2, absolute.shape[1] - 1)]
+    scale = 1.4826*(lower + upper)/2
+    return np.where(np.isfinite(scale) & (scale > 0), scale, np.inf)
+
+def _residuals(positions, anchors, ranges):
+    dx = positions[:, 0, np.newaxis] - anchors[..., 0]
+    dy = positions[:, 1, np.newaxis] - anchors[..., 1]
+    distances = np.sqrt(dx*dx + dy*dy)
+    return dx, dy, distances, distances - ranges
+
+def robust_multilaterate(anchors, ranges, mask=None, weights=None, loss="huber", threshold=None, iterations=20, tolerance=1e-6, ransac_hypotheses=0, rng=None):
+    """Weighted nonlinear least-squares multilateration with outlier handling,
+    using every available anchor of every robot.
+
+    Each robot starts from a linear least-squares fit and is refined with
+    Gauss-Newton iterations that run for all robots at once; robots drop out
+    of the batch as they converge.  With loss="huber" the iterations
+    reweight residuals larger than threshold (iteratively reweighted least
+    squares).  With ransac_hypotheses > 0, random anchor triples are first
+    tried for every robot and only the measurements consistent with the
+    best triple are kept.
+
+    anchors: Kx2 numpy array (of anchor x, y positions shared by every robot)
+             or MxKx2 numpy array (of each robot's own anchors, padding masked out)
+    ranges: MxK numpy array (of ranges from each robot to each anchor)
+    mask: MxK boolean numpy array (of usable measurements, all by default)
+    weights: MxK numpy array (of measurement weights, e.g. inverse variances, ones by default)
+    loss: string ("l2" or "huber")
+    threshold: double (residual size treated as an outlier, None estimates
+               2.5 robust standard deviations per robot)
+    iterations: int (maximum Gauss-Newton iterations)
+    tolerance: double (a robot has converged once its step is shorter than this)
+    ransac_hypotheses: int (random anchor triples to try per robot, 0 disables RANSAC)
+    rng: numpy Generator or the numpy.random module (source of the RANSAC samples)
+
+    -> tuple of Mx2 numpy array (of estimated positions, nan for robots with
+       fewer than three usable anchors) and MxK boolean numpy array (of the
+       measurements kept as inliers)
+    """
+    #Check user input types
+    assert isinstance(anchors, np.ndarray), "In the robust_multilaterate function, the anchor positions (anchors) must be a numpy ndarray. Recieved type %r." % type(anchors).__name__
+    assert isinstance(ranges, np.ndarray), "In the robust_multilaterate function, the anchor ranges (ranges) must be a numpy ndarray. Recieved type %r." % type(ranges).__name__
+
+    #Check user input ranges/sizes
+    assert loss in ("l2", "huber"), "In the robust_multilaterate function, the loss must be 'l2' or 'huber'. Recieved %r." % loss
+    assert anchors.ndim in (2, 3) and anchors.shape[-1] == 2, "In the robust_multilaterate function, the anchor positions (anchors) must be a Kx2 or MxKx2 array. Recieved an array of shape %r." % (anchors.shape,)
+    assert ranges.ndim == 2 and ranges.shape[1] == anchors.shape[-2], "In the robust_multilaterate function, the ranges must be an MxK array with one column per anchor. Recieved %r anchors and a range array of shape %r." % (anchors.shape[-2], ranges.shape)
+    assert anchors.ndim == 2 or anchors.shape[0] == ranges.shape[0], "In the robust_multilaterate function, per-robot anchors must have one row per robot. Recieved %r anchor sets for %r robots." % (anchors.shape[0], ranges.shape[0])
+
+    if rng is None:
+        rng = np.random
+    mask = np.isfinite(ranges) if mask is None else mask & np.isfinite(ranges)
+    if anchors.ndim == 3:
+        mask = mask & np.isfinite(anchors).all(axis=2)
+        anchors = np.where(mask[..., np.newaxis], anchors, 0)
+    weights = np.where(mask, 1 if weights is None else weights, 0)
+    ranges = np.where(mask, ranges, 0)
+    localizable = np.count_nonzero(mask, axis=1) >= 3
+
+    # With three anchors or fewer there is no subset to choose between
+    if ransac_hypotheses > 0 and anchors.shape[-2] > 3:
+        mask = _ransac_inliers(anchors, ranges, mask, threshold, ransac_hypotheses, rng)
+        weights = np.where(mask, weights, 0)
+
+    positions = _linear_multilaterate(anchors, ranges, weights)
+
+    # Only robots that are still moving are carried into the next iteration
+    active = np.flatnonzero(localizable & np.isfinite(positions).all(axis=1))
+    for _ in range(iterations):
+        if active.size == 0:
+            break
+
+        dx, dy, distances, residuals = _residuals(positions[active], anchors if anchors.ndim == 2 else anchors[active], ranges[active])
+        effective = weights[active]
+        if loss == "huber":
+            limit = 2.5*_robust_scale(residuals, mask[active])[:, np.newaxis] if threshold is None else threshold
+            absolute = np.abs(residuals)
+            effective = effective*np.where(absolute <= limit, 1, limit/np.maximum(absolute, 1e-300))
+
+        # Rows of the Jacobian are the unit vectors from each anchor to the robot
+        np.maximum(distances, 1e-12, out=distances)
+        u = dx/distances
+        v = dy/distances
+        a = np.sum(effective*u*u, axis=1)
+        b = np.sum(effective*u*v, axis=1)
+        c = np.sum(effective*v*v, axis=1)
+        g = np.sum(effective*u*residuals, axis=1)
+        h = np.sum(effective*v*residuals, axis=1)
+
+        determinant = a*c - b*b
+        determinant = np.where(np.abs(determinant) > 1e-300, determinant, np.inf)
+        step = np.column_stack(((c*g - b*h)/determinant, (a*h - b*g)/determinant))
+        # Near-collinear anchors make the normal matrix almost singular; no step needs to
+        # be longer than the robot's largest range, so longer ones are shortened to it
+        length = np.sqrt(np.einsum('ij,ij->i', step, step))
+        reach = np.max(np.where(mask[active], ranges[active], 0), axis=1)
+        step *= np.minimum(1, reach/np.maximum(length, 1e-300))[:, np.newaxis]
+        positions[active] -= step
+
+        active = active[np.max(np.abs(step), axis=1) >= tolerance]
+
+    positions[~localizable] = np.nan
+
+    return positions, mask
+
+def _ransac_inliers(anchors, ranges, mask, threshold, hypotheses, rng):
+    M, K = ranges.shape
+    rows = np.arange(M)[:, np.newaxis]
+    best_count = np.full(M, -1)
+    best_inliers = mask.copy()
+
+    if threshold is None:
+        # Scale the inlier band from an all-measurement fit
+        _, _, _, residuals = _residuals(_linear_multilaterate(anchors, ranges, mask.astype(float)), anchors, ranges)
+        threshold = 2.5*_robust_scale(residuals, mask)[:, np.newaxis]
+
+    for _ in range(hypotheses):
+        # Three distinct usable anchors per robot: the largest random keys among its mask
+        keys = np.where(mask, rng.uniform(size=(M, K)), -1)
+        triple = np.argpartition(-keys, 2, axis=1)[:, :3]
+        candidate = _three_anchor_solve(anchors[triple] if anchors.ndim == 2 else anchors[rows, triple], ranges[rows, triple])
+
+        _, _, _, residuals = _residuals(candidate, anchors, ranges)
+        inliers = mask & (np.abs(residuals) <= threshold)
+        count = np.count_nonzero(inliers, axis=1)
+        better = np.isfinite(candidate).all(axis=1) & (count > best_count)
+        best_count[better] = count[better]
+        best_inliers[better] = inliers[better]
+
+    # Fall back to every measurement where no hypothesis kept enough of them
+    enough = best_count >= 3
+    return np.where(enough[:, np.newaxis], best_inliers, mask)
+
+def anchor_geometry(positions, anchors, mask=None):
+    """Scores how well the anchors surround each robot, from 0 (all anchors on
+    one line through the robot, so a mirrored position fits as well) to 1
+    (bearings spread evenly around it).
+
+    The score is the ratio of the smallest to the largest eigenvalue of the
+    sum of outer products of the unit bearing vectors, i.e. the conditioning
+    of the Gauss-Newton normal matrix.
+
+    positions: Mx2 numpy array (of robot x, y positions)
+    anchors: Kx2 or MxKx2 numpy array (of anchor x, y positions, as for robust_multilaterate)
+    mask: MxK boolean numpy array (of anchors to include, all by default)
+
+    -> M numpy array (of scores in [0, 1], nan where a position is not finite)
+    """
+    dx, dy, distances, _ = _residuals(positions, anchors, 0)
+    with np.errstate(all="ignore"):
+        u = dx/distances
+        v = dy/distances
+    include = np.isfinite(u) & np.isfinite(v) if mask is None else mask & np.isfinite(u) & np.isfinite(v)
+    u = np.where(include, u, 0)
+    v = np.where(include, v, 0)
+
+    a = np.sum(u*u, axis=1)
+    b = np.sum(u*v, axis=1)
+    c = np.sum(v*v, axis=1)
+    half_trace = (a + c)/2
+    spread = np.sqrt(((a - c)/2)**2 + b*b)
+    with np.errstate(all="ignore"):
+        score = (half_trace - spread)/(half_trace + spread)
+
+    return np.where(np.isfinite(positions).all(axis=1), np.nan_to_num(score), np.nan)
+
+def rigid_alignments(source, target, groups, num_groups, allow_reflection=True):
+    """Finds, for every group of corresponding points, the rotation and
+    translation that best map source onto target in the least-squares sense
+    (Umeyama's method without scale), for all groups at once.
+
+    Local frames built from ranges alone have an arbitrary handedness, so
+    reflections are allowed by default.
+
+    source: Kx2 numpy array (of points in each group's source frame)
+    target: Kx2 numpy array (of the same points in its target frame)
+    groups: K numpy index array (of the group of each correspondence)
+    num_groups: int (number of groups G)
+    allow_reflection: bool (whether the orthogonal part may be a reflection)
+
+    -> tuple of Gx2x2 numpy array (of orthogonal matrices R) and Gx2 numpy
+       array (of translations t) with target ~ R @ source + t, nan for
+       groups with fewer than three correspondences
+    """
+    #Check user input types
+    assert isinstance(source, np.ndarray), "In the rigid_alignments function, the source points (source) must be a numpy ndarray. Recieved type %r." % type(source).__name__
+    assert isinstance(target, np.ndarray), "In the rigid_alignments function, the target points (target) must be a numpy ndarray. Recieved type %r." % type(target).__name__
+
+    #Check user input ranges/sizes
+    assert source.shape == target.shape and source.ndim == 2 and source.shape[1] == 2, "In the rigid_alignments function, the source and target points must be Kx2 arrays of the same shape. Recieved %r and %r." % (source.shape, target.shape)
+
+    counts = np.bincount(groups, minlength=num_groups)
+    with np.errstate(all="ignore"):
+        source_mean = np.column_stack([np.bincount(groups, source[:, i], num_groups) for i in range(2)])/counts[:, np.newaxis]
+        target_mean = np.column_stack([np.bincount(groups, target[:, i], num_groups) for i in range(2)])/counts[:, np.newaxis]
+    centered_source = source - source_mean[groups]
+    centered_target = target - target_mean[groups]
+
+    # Cross-covariance of every group, accumulated entry by entry
+    covariance = np.empty((num_groups, 2, 2))
+    for i in range(2):
+        for j in range(2):
+            covariance[:, i, j] = np.bincount(groups, centered_target[:, i]*centered_source[:, j], num_groups)
+
+    enough = counts >= 3
+    rotations = np.full((num_groups, 2, 2), np.nan)
+    translations = np.full((num_groups, 2), np.nan)
+    if not enough.any():
+        return rotations, translations
+
+    U, _, Vt = np.linalg.svd(covariance[enough])
+    if not allow_reflection:
+        flip = np.linalg.det(U @ Vt) < 0
+        U[flip, :, 1] *= -1
+    rotations[enough] = U @ Vt
+    translations[enough] = target_mean[enough] - np.einsum('gij,gj->gi', rotations[enough], source_mean[enough])
+
+    return rotations, translations
+
+def _top_embedding(gram, dimensions):
+    # Coordinates from the largest eigenpairs of a Gram matrix (negative eigenvalues clipped);
+    # Lanczos finds just those pairs, far cheaper than a full decomposition of a large matrix
+    if gram.shape[0] > 10*dimensions:
+        values, vectors = eigsh(gram, k=dimensions, which="LA")
+    else:
+        values, vectors = np.linalg.eigh(gram)
+    order = np.argsort(values)[::-1][:dimensions]
+    values = values[order]
+    vectors = vectors[:, order]
+    return vectors*np.sqrt(np.maximum(values, 0)), values, vectors
+
+def classical_mds(distances, dimensions=2):
+    """Embeds points from all their pairwise distances with classical
+    (Torgerson) multidimensional scaling.  O(N^3) in the number of points.
+
+    distances: NxN numpy array (of pairwise distances, e.g. ranges completed by shortest paths)
+    dimensions: int (embedding dimension)
+
+    -> Nxdimensions numpy array (of positions, determined up to a rigid motion)
+    """
+    #Check user input types
+    assert isinstance(distances, np.ndarray), "In the classical_mds function, the distances must be a numpy ndarray. Recieved type %r." % type(distances).__name__
+
+    #Check user input ranges/sizes
+    assert distances.ndim == 2 and distances.shape[0] == distances.shape[1], "In the classical_mds function, the distances must be a square NxN array. Recieved an array of shape %r." % (distances.shape,)
+
+    # Double centering, -J D^2 J / 2, without forming J
+    return _top_embedding(-_double_center(distances**2)/2, dimensions)[0]
+
+def landmark_mds(landmark_distances, landmarks, dimensions=2):
+    """Landmark MDS: embeds the landmarks with classical MDS and places every
+    other point by distance-based triangulation against them.  Only the
+    distances from the k landmarks are needed, and the cost is O(k^3 + kN).
+
+    landmark_distances: kxN numpy array (of distances from each landmark to every point)
+    landmarks: k numpy index array (of the column of each landmark)
+    dimensions: int (embedding dimension, below k)
+
+    -> Nxdimensions numpy array (of positions, determined up to a rigid motion)
+    """
+    #Check user input types
+    assert isinstance(landmark_distances, np.ndarray), "In the landmark_mds function, the landmark distances must be a numpy ndarray. Recieved type %r." % type(landmark_distances).__name__
+
+    #Check user input ranges/sizes
+    assert landmark_distances.ndim == 2 and landmark_distances.shape[0] == len(landmarks), "In the landmark_mds function, the landmark distances must be a kxN array with one row per landmark. Recieved %r landmarks and an array of shape %r." % (len(landmarks), landmark_distances.shape)
+    assert len(landmarks) > dimensions, "In the landmark_mds function, more landmarks than dimensions are needed. Recieved %r landmarks for %r dimensions." % (len(landmarks), dimensions)
+
+    squared = landmark_distances**2
+    embedded, values, vectors = _top_embedding(-_double_center(squared[:, landmarks])/2, dimensions)
+
+    # x = -L#^T (delta - mean delta)/2 with L#^T = vectors/sqrt(values)
+    mean = squared[:, landmarks].mean(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pseudo_inverse = np.where(values > 0, vectors/np.sqrt(values), 0)
+    return -((squared - mean[:, np.newaxis]).T @ pseudo_inverse)/2
+
+def _double_center(matrix):
+    matrix = (matrix + matrix.T)/2
+    return matrix - matrix.mean(axis=0) - matrix.mean(axis=1)[:, np.newaxis] + matrix.mean()
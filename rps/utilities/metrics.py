@@ -0,0 +1,46 @@
+import numpy as np
+
+
+def edge_distance_errors(true_positions, estimated_positions, rows, cols, percentiles=(50, 90, 95, 99)):
+    """Compares true and estimated inter-robot distances over a list of edges.
+
+    true_positions: Nx2 numpy array (of true x, y positions)
+    estimated_positions: Nx2 numpy array (of estimated x, y positions)
+    rows: K numpy index array (of edge start robots)
+    cols: K numpy index array (of edge end robots)
+    percentiles: tuple of double (percentiles of the absolute error to report)
+
+    -> dict with "errors" (K signed true minus estimated distances),
+       "squared_errors" (K), "mse", "rmse", "max" and "percentiles"
+       (dict mapping each requested percentile to its absolute error)
+    """
+    #Check user input types
+    assert isinstance(true_positions, np.ndarray), "In the edge_distance_errors function, the true positions (true_positions) must be a numpy ndarray. Recieved type %r." % type(true_positions).__name__
+    assert isinstance(estimated_positions, np.ndarray), "In the edge_distance_errors function, the estimated positions (estimated_positions) must be a numpy ndarray. Recieved type %r." % type(estimated_positions).__name__
+
+    #Check user input ranges/sizes
+    assert true_positions.shape == estimated_positions.shape, "In the edge_distance_errors function, the true and estimated positions must have the same shape. Recieved %r and %r." % (true_positions.shape, estimated_positions.shape)
+
+    true_offsets = true_positions[rows] - true_positions[cols]
+    estimated_offsets = estimated_positions[rows] - estimated_positions[cols]
+    errors = np.sqrt(np.einsum('ij,ij->i', true_offsets, true_offsets)) - np.sqrt(np.einsum('ij,ij->i', estimated_offsets, estimated_offsets))
+    squared_errors = errors**2
+
+    if errors.size == 0:
+        mse = np.nan
+        maximum = np.nan
+        levels = np.full(len(percentiles), np.nan)
+    else:
+        mse = np.mean(squared_errors)
+        absolute = np.abs(errors)
+        maximum = np.max(absolute)
+        levels = np.percentile(absolute, percentiles)
+
+    return {
+        "errors": errors,
+        "squared_errors": squared_errors,
+        "mse": mse,
+        "rmse": np.sqrt(mse),
+        "max": maximum,
+        "percentiles": dict(zip(percentiles, levels)),
+    }
@@ -0,0 +1,199 @@
+import numpy as np
+
+
+def squared_distances(positions, other_positions=None):
+    """Computes the squared Euclidean distance between every pair of positions.
+
+    positions: Nx2 numpy array (of x, y positions)
+    other_positions: Mx2 numpy array (of x, y positions, defaults to positions)
+
+    -> NxM numpy array (of squared distances)
+    """
+    #Check user input types
+    assert isinstance(positions, np.ndarray), "In the squared_distances function, the robot positions (positions) must be a numpy ndarray. Recieved type %r." % type(positions).__name__
+
+    #Check user input ranges/sizes
+    assert positions.ndim == 2 and positions.shape[1] == 2, "In the squared_distances function, the robot positions (positions) must be an Nx2 array. Recieved an array of shape %r." % (positions.shape,)
+
+    if other_positions is None:
+        other_positions = positions
+
+    dx = np.subtract.outer(positions[:, 0], other_positions[:, 0])
+    dy = np.subtract.outer(positions[:, 1], other_positions[:, 1])
+    dx *= dx
+    dy *= dy
+    dx += dy
+
+    return dx
+
+def apply_range_noise(distances_squared, std_noise, rng=None):
+    """Turns true squared distances into noisy range measurements.
+
+    The noise is added to the squared distance and clipped from below at the
+    true distance, which is the model used by Robot.distance_to.
+
+    distances_squared: numpy array (of true squared distances, any shape)
+    std_noise: double (standard deviation of the range noise)
+    rng: numpy Generator or the numpy.random module (source of the noise)
+
+    -> numpy array (of noisy ranges, same shape as distances_squared)
+    """
+    if rng is None:
+        rng = np.random
+
+    distances_squared = np.asarray(distances_squared, dtype=float)
+    if std_noise == 0:
+        return np.sqrt(distances_squared)
+
+    noise = std_noise*rng.standard_normal(distances_squared.shape)
+    np.maximum(noise, -np.sqrt(distances_squared), out=noise)
+
+    return np.sqrt(distances_squared + noise)
+
+def noisy_pair_ranges(positions, rows, cols, std_noise, rng=None):
+    """Measures the noisy range robot rows[k] measures to robot cols[k] for every k.
+
+    positions: Nx2 numpy array (of x, y positions)
+    rows: K numpy index array (of measuring robots)
+    cols: K numpy index array (of measured robots)
+    std_noise: double (standard deviation of the range noise)
+    rng: numpy Generator or the numpy.random module (source of the noise)
+
+    -> K numpy array (of noisy ranges)
+    """
+    # As complex numbers a position is gathered in one access instead of two
+    points = np.ascontiguousarray(positions, dtype=float).view(np.complex128).ravel()
+    d = points[rows] - points[cols]
+
+    return apply_range_noise(d.real**2 + d.imag**2, std_noise, rng)
+
+def detectable_distance(radius, std_noise, tail=8):
+    """Returns the largest true distance whose noisy range can still be within radius.
+
+    The clipped noise never lowers a squared distance d^2 below d^2 - d, and
+    lowers it by more than tail*std_noise only with the probability of a
+    Gaussian tail (about 6e-16 for 8 standard deviations), so pairs further
+    apart than this can be skipped without measuring them.
+
+    radius: double (range threshold)
+    std_noise: double (standard deviation of the range noise)
+    tail: double (standard deviations of noise treated as the largest possible)
+
+    -> double
+    """
+    if std_noise == 0:
+        return radius
+
+    return min((1 + np.sqrt(1 + 4*radius**2))/2, np.sqrt(radius**2 + tail*std_noise))
+
+
+class RangeCache:
+    """Memoizes noisy directed range measurements between robots.
+
+    The first time robot i measures robot j the range is drawn with
+    noisy_pair_ranges; every later request for (i, j) returns that same
+    value until one of the two robots is invalidated, so all phases of a
+    round see one consistent set of measurements.  Keys are kept sorted in a
+    flat array, so lookups and insertions are vectorized.
+
+    The positions array is read live, so it must be updated in place and
+    invalidate must be called for robots that move.
+    """
+
+    def __init__(self, positions, std_noise, rng=None):
+        #Check user input types
+        assert isinstance(positions, np.ndarray), "The robot positions (positions) provided to create a RangeCache must be a numpy ndarray. Recieved type %r." % type(positions).__name__
+        #Check user input ranges/sizes
+        assert positions.ndim == 2 and positions.shape[1] == 2, "The robot positions (positions) provided to create a RangeCache must be an Nx2 array. Recieved an array of shape %r." % (positions.shape,)
+
+        self.positions = positions
+        self.std_noise = std_noise
+        self.rng = np.random if rng is None else rng
+        self.number_of_robots = positions.shape[0]
+        self.invalidate()
+
+    def __len__(self):
+        return self._keys.size
+
+    def measure(self, rows, cols):
+        """Returns the range robot rows[k] measures to robot cols[k] for every k,
+        measuring only the pairs that are not cached yet.
+
+        rows: K numpy index array (of measuring robots)
+        cols: K numpy index array (of measured robots)
+
+        -> K numpy array (of noisy ranges)
+        """
+        keys = np.asarray(rows, dtype=np.int64)*self.number_of_robots + np.asarray(cols, dtype=np.int64)
+        # Looking keys up in sorted order keeps the binary searches cache friendly
+        order = np.argsort(keys)
+        keys = keys[order]
+        if self._keys.size == 0:
+            return self._fill(keys, order)
+
+        slots = np.searchsorted(self._keys, keys)
+        found = slots < self._keys.size
+        found[found] = self._keys[slots[found]] == keys[found]
+
+        if not found.all():
+            # A pair requested twice in one call is still measured once
+            missing = keys[~found]
+            missing = missing[np.concatenate(([True], missing[1:] != missing[:-1]))]
+            i, j = np.divmod(missing, self.number_of_robots)
+            self._insert(missing, noisy_pair_ranges(self.positions, i, j, self.std_noise, self.rng))
+            slots = np.searchsorted(self._keys, keys)
+
+        ranges = np.empty(keys.size)
+        ranges[order] = self._values[slots]
+        return ranges
+
+    def _fill(self, keys, order):
+        # An empty cache takes every distinct sorted key at once, without lookups or inserts
+        distinct = np.ones(keys.size, dtype=bool)
+        distinct[1:] = keys[1:] != keys[:-1]
+        self._keys = keys[distinct]
+        i, j = np.divmod(self._keys, self.number_of_robots)
+        self._values = noisy_pair_ranges(self.positions, i, j, self.std_noise, self.rng)
+
+        ranges = np.empty(keys.size)
+        ranges[order] = self._values[np.cumsum(distinct) - 1]
+        return ranges
+
+    def record(self, rows, cols, ranges):
+        """Stores ranges that were measured elsewhere, e.g. the ranges of a neighbor
+        graph, so later requests for those pairs return them.  Pairs already
+        cached keep their cached value.
+
+        rows: K numpy index array (of measuring robots)
+        cols: K numpy index array (of measured robots)
+        ranges: K numpy array (of measured ranges)
+        """
+        keys = np.asarray(rows, dtype=np.int64)*self.number_of_robots + np.asarray(cols, dtype=np.int64)
+        keys, first = np.unique(keys, return_index=True)
+        slots = np.searchsorted(self._keys, keys)
+        found = slots < self._keys.size
+        found[found] = self._keys[slots[found]] == keys[found]
+        self._insert(keys[~found], np.asarray(ranges, dtype=float)[first[~found]])
+
+    def _insert(self, keys, values):
+        # keys must be sorted, unique and not cached yet
+        at = np.searchsorted(self._keys, keys)
+        self._keys = np.insert(self._keys, at, keys)
+        self._values = np.insert(self._values, at, values)
+
+    def invalidate(self, indices=None):
+        """Forgets the measurements made by or to the given robots (all of them by default).
+
+        indices: numpy index array (of robots that moved)
+        """
+        if indices is None:
+            self._keys = np.zeros(0, dtype=np.int64)
+            self._values = np.zeros(0)
+            return
+
+        moved = np.zeros(self.number_of_robots, dtype=bool)
+        moved[indices] = True
+        i, j = np.divmod(self._keys, self.number_of_robots)
+        keep = ~(moved[i] | moved[j])
+        self._keys = self._keys[keep]
+        self._values = self._values[keep]
@@ -0,0 +1,112 @@
+import os
+
+import numpy as np
+
+# TrajectoryRecorder streams per-step arrays (e.g. the stacked filter states
+# and covariances) into memory-mapped .npy files that act as ring buffers, so
+# a long run keeps at most capacity records on disk and almost nothing in
+# RAM.  Every file is a plain .npy, so np.load(path, mmap_mode="r") reads a
+# recording without this class.
+
+class TrajectoryRecorder:
+    """Ring-buffered recording of named per-step arrays in a directory.
+
+    Each name gets <name>.npy of shape (capacity,) + shape, and steps.npy
+    holds the step number stored in every slot (-1 while a slot is empty).
+    A step's slot number is written last, so a record interrupted half way
+    is never reported.  Reopening a directory that already holds a
+    recording with the same layout resumes it.
+    """
+
+    def __init__(self, directory, shapes, capacity, decimation=1, flush_interval=50):
+        """
+        directory: string (where the .npy files live, created if missing)
+        shapes: dict mapping name to tuple (shape of one step's array)
+        capacity: int (number of records kept before the oldest is overwritten)
+        decimation: int (only every decimation-th step is recorded)
+        flush_interval: int (records between flushes to disk)
+        """
+        assert capacity > 0, "The capacity (capacity) of a TrajectoryRecorder must be positive. Recieved %r." % capacity
+        assert decimation > 0, "The decimation (decimation) of a TrajectoryRecorder must be positive. Recieved %r." % decimation
+        assert "steps" not in shapes, "The name 'steps' is reserved by TrajectoryRecorder for the step numbers."
+
+        self.directory = directory
+        self.capacity = capacity
+        self.decimation = decimation
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self.steps = self._open("steps", (capacity,), np.int64, fill=-1)
+        self.arrays = {name: self._open(name, (capacity,) + tuple(shape), np.float64) for name, shape in shapes.items()}
+
+        # Resume after the newest record already on disk
+        self._next = (int(np.argmax(self.steps)) + 1) % capacity if self.steps.max() >= 0 else 0
+        self._unflushed = 0
+
+    def _path(self, name):
+        return os.path.join(self.directory, name + ".npy")
+
+    def _open(self, name, shape, dtype, fill=0):
+        path = self._path(name)
+        if os.path.exists(path):
+            array = np.lib.format.open_memmap(path, mode="r+")
+            assert array.shape == shape and array.dtype == dtype, "The recording %r has shape %r and dtype %s, which does not match the requested %r and %s." % (path, array.shape, array.dtype, shape, np.dtype(dtype))
+            return array
+        array = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+        array[...] = fill
+        return array
+
+    def __len__(self):
+        return int(np.count_nonzero(self.steps >= 0))
+
+    def record(self, step, **arrays):
+        """Stores the arrays of a step if the step falls on the decimation.
+
+        step: int (step number, increasing from call to call)
+        arrays: numpy arrays (one per name given at construction)
+
+        -> bool (whether the step was recorded)
+        """
+        if step % self.decimation:
+            return False
+
+        slot = self._next
+        # Mark the slot empty while it is overwritten
+        self.steps[slot] = -1
+        for name, array in arrays.items():
+            self.arrays[name][slot] = array
+        self.steps[slot] = step
+        self._next = (slot + 1) % self.capacity
+
+        self._unflushed += 1
+        if self._unflushed >= self.flush_interval:
+            self.flush()
+        return True
+
+    def flush(self):
+        for array in self.arrays.values():
+            array.flush()
+        self.steps.flush()
+        self._unflushed = 0
+
+    def latest(self):
+        """Returns the newest complete record, e.g. to resume a run.
+
+        -> tuple of int (step number) and dict mapping name to numpy array,
+           or None when nothing was recorded
+        """
+        if self.steps.max() < 0:
+            return None
+        slot = int(np.argmax(self.steps))
+        return int(self.steps[slot]), {name: np.array(array[slot]) for name, array in self.arrays.items()}
+
+    def trajectory(self, name):
+        """Reads the recorded history of one array, oldest record first.
+
+        name: string (array name)
+
+        -> tuple of K numpy array (of step numbers) and Kx... numpy array (of records)
+        """
+        slots = np.flatnonzero(self.steps >= 0)
+        slots = slots[np.argsort(self.steps[slots])]
+        return np.array(self.steps[slots]), self.arrays[name][slots]
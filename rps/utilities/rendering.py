@@ -0,0 +1,123 @@
+import numpy as np
+from matplotlib.collections import PolyCollection
+
+# RobotRenderer draws every robot of a Robotarium figure as polygons of one
+# PolyCollection.  The outline of each part (wheels, chassis, LEDs) is fixed
+# in the robot's frame, so a frame is one vectorized rotation and
+# translation of all outlines.  When the backend supports it the robots are
+# blitted over a cached background holding the arena and everything else
+# on the axes; the background is redrawn only when another artist changed.
+
+# Vertices per outline; the chassis rectangle repeats its corners to match
+_VERTICES = 16
+
+
+def _circle(center, radius):
+    angles = np.linspace(0, 2*np.pi, _VERTICES, endpoint=False)
+    return np.column_stack((center[0] + radius*np.cos(angles), center[1] + radius*np.sin(angles)))
+
+def _rectangle(corner, length, width):
+    corners = np.array(((0, 0), (0, -length), (width, -length), (width, 0))) + corner
+    return np.repeat(corners, _VERTICES//4, axis=0)
+
+def robot_outlines(robot_length, robot_width):
+    """Outlines of a robot's parts in its own frame, in drawing order:
+    right wheel, left wheel, chassis, left LED, right LED.
+
+    robot_length: double
+    robot_width: double
+
+    -> 5xVx2 numpy array (of coordinates along and left of the heading)
+    """
+    # Same placement as the patches of the original Robotarium figure
+    wheel_offset = robot_length/2 - 0.04
+    led_offset = 0.75*robot_length/2 + robot_length/2
+    return np.stack((
+        _circle((wheel_offset, robot_length/2), 0.02),
+        _circle((wheel_offset, -robot_length/2), 0.02),
+        _rectangle((wheel_offset, robot_length/2), robot_length, robot_width),
+        _circle((led_offset, -0.015), robot_length/2/5),
+        _circle((led_offset, -0.04), robot_length/2/5),
+    ))
+
+def place_outlines(outlines, poses):
+    """Moves robot-frame outlines to every robot's pose.
+
+    outlines: KxVx2 numpy array (of robot-frame coordinates)
+    poses: 3xN numpy array (of x, y, theta)
+
+    -> KxNxVx2 numpy array (of world coordinates)
+    """
+    c = np.cos(poses[2])
+    s = np.sin(poses[2])
+    along = outlines[:, None, :, 0]
+    left = outlines[:, None, :, 1]
+
+    placed = np.empty((outlines.shape[0], poses.shape[1], outlines.shape[1], 2))
+    placed[..., 0] = poses[0, :, None] + along*c[:, None] - left*s[:, None]
+    placed[..., 1] = poses[1, :, None] + along*s[:, None] + left*c[:, None]
+    return placed
+
+
+class RobotRenderer:
+
+    _FACE_COLORS = ('k', 'k', '#FFD700', 'none', 'none')
+
+    def __init__(self, axes, poses, robot_length, robot_width):
+        """
+        axes: matplotlib Axes (to draw on)
+        poses: 3xN numpy array (of initial x, y, theta)
+        robot_length: double
+        robot_width: double
+        """
+        self.axes = axes
+        self.canvas = axes.figure.canvas
+        self.outlines = robot_outlines(robot_length, robot_width)
+        self.number_of_robots = poses.shape[1]
+
+        # Parts are grouped by kind so wheels stay under chassis and LEDs on top
+        face_colors = np.repeat(self._FACE_COLORS, self.number_of_robots)
+        self.collection = PolyCollection(self._vertices(poses), closed=True, facecolors=face_colors, edgecolors='k')
+        axes.add_collection(self.collection)
+
+        self.blit = self.canvas.supports_blit
+        self.background = None
+        if self.blit:
+            # Animated artists are left out of full draws, which then yield the background
+            self.collection.set_animated(True)
+            self.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _vertices(self, poses):
+        return place_outlines(self.outlines, poses).reshape(-1, self.outlines.shape[1], 2)
+
+    @property
+    def detached(self):
+        """Whether the robots were removed from the figure, e.g. by plt.clf()."""
+        return self.collection.axes is None or self.collection.figure is None
+
+    def _on_draw(self, event):
+        if self.detached:
+            self.background = None
+            return
+        self.background = self.canvas.copy_from_bbox(self.axes.figure.bbox)
+        self.axes.draw_artist(self.collection)
+
+    def draw(self, poses):
+        """Moves the robots to poses and shows the new frame.
+
+        poses: 3xN numpy array (of x, y, theta)
+        """
+        self.collection.set_verts(self._vertices(poses))
+
+        if self.detached or not self.blit:
+            # A script that cleared the figure (plt.clf()) draws its own contents
+            self.canvas.draw_idle()
+        elif self.background is None or self.axes.figure.stale:
+            # Something besides the robots changed, so the background is stale too
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+            self.axes.draw_artist(self.collection)
+        if self.blit and not self.detached:
+            self.canvas.blit(self.axes.figure.bbox)
+        self.canvas.flush_events()
@@ -0,0 +1,88 @@
+import numpy as np
+
+# Vectorized kernels shared by the Robotarium simulators.  Every function
+# works on poses of shape (..., 3, N) and velocities of shape (..., 2, N), so
+# the same code steps one simulator (3xN) or a batch of them (Bx3xN).
+
+def integrate_unicycles(poses, velocities, time_step):
+    """Advances unicycle poses in place over one time step and wraps the
+    headings to [-pi, pi).
+
+    poses: ...x3xN numpy array (of x, y, theta)
+    velocities: ...x2xN numpy array (of linear and angular velocities)
+    time_step: double
+    """
+    theta = poses[..., 2, :]
+    advance = time_step*velocities[..., 0, :]
+    poses[..., 0, :] += advance*np.cos(theta)
+    poses[..., 1, :] += advance*np.sin(theta)
+    theta += time_step*velocities[..., 1, :]
+    np.subtract(np.remainder(theta + np.pi, 2*np.pi), np.pi, out=theta)
+
+def threshold_velocities(velocities, max_linear_velocity, max_angular_velocity):
+    """Clips linear and angular velocities in place to their limits.
+
+    velocities: ...x2xN numpy array (of linear and angular velocities)
+    max_linear_velocity: double
+    max_angular_velocity: double
+    """
+    np.clip(velocities[..., 0, :], -max_linear_velocity, max_linear_velocity, out=velocities[..., 0, :])
+    np.clip(velocities[..., 1, :], -max_angular_velocity, max_angular_velocity, out=velocities[..., 1, :])
+
+def outside_boundaries(poses, boundaries):
+    """Finds the robots outside the arena.
+
+    poses: ...x3xN numpy array (of x, y, theta)
+    boundaries: list (lower left x, lower left y, width, height)
+
+    -> ...xN boolean numpy array
+    """
+    x = poses[..., 0, :]
+    y = poses[..., 1, :]
+    return (x < boundaries[0]) | (x > boundaries[0] + boundaries[2]) | (y < boundaries[1]) | (y > boundaries[1] + boundaries[3])
+
+def collision_centers(poses, collision_offset):
+    """Places every robot's collision circle collision_offset ahead of it
+    along its heading.
+
+    poses: ...x3xN numpy array (of x, y, theta)
+    collision_offset: double
+
+    -> tuple of two ...xN numpy arrays (of x and y)
+    """
+    theta = poses[..., 2, :]
+    return poses[..., 0, :] + collision_offset*np.cos(theta), poses[..., 1, :] + collision_offset*np.sin(theta)
+
+def collision_counts(poses, collision_offset, collision_diameter):
+    """Counts, for every robot, the other robots it collides with.  Two
+    robots collide when their collision circles are at most
+    collision_diameter apart.
+
+    poses: ...x3xN numpy array (of x, y, theta)
+    collision_offset: double
+    collision_diameter: double
+
+    -> ...xN numpy int array (of colliding partners)
+    """
+    # At most 50 robots per simulator, so the dense NxN test is cheap
+    x, y = collision_centers(poses, collision_offset)
+    dx = x[..., :, None] - x[..., None, :]
+    dy = y[..., :, None] - y[..., None, :]
+    colliding = dx*dx + dy*dy <= collision_diameter**2
+    # A robot always overlaps itself
+    return np.count_nonzero(colliding, axis=-1) - 1
+
+def exceeds_actuator_limits(velocities, wheel_radius, base_length, max_wheel_velocity):
+    """Checks whether any robot's wheel speeds exceed the actuator limit.
+
+    velocities: ...x2xN numpy array (of linear and angular velocities)
+    wheel_radius: double
+    base_length: double
+    max_wheel_velocity: double
+
+    -> ... boolean numpy array
+    """
+    linear = velocities[..., 0, :]
+    turning = base_length*velocities[..., 1, :]/2
+    wheel_speed = (np.abs(linear) + np.abs(turning))/wheel_radius
+    return np.any(wheel_speed > max_wheel_velocity, axis=-1)
@@ -0,0 +1,468 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from rps.utilities.graph import ragged_ranges
+from rps.utilities.ranging import squared_distances
+
+# Spatial indexes answer fixed-radius neighbor queries over a set of 2D
+# positions.  Build one per round with create_spatial_index and ask it for
+# the pairs (or the neighbor count of every robot) within a radius.
+
+class SpatialIndex(ABC):
+
+    def __init__(self, positions):
+        #Check user input types
+        assert isinstance(positions, np.ndarray), "The robot positions (positions) provided to create a spatial index must be a numpy ndarray. Recieved type %r." % type(positions).__name__
+        #Check user input ranges/sizes
+        assert positions.ndim == 2 and positions.shape[1] == 2, "The robot positions (positions) provided to create a spatial index must be an Nx2 array. Recieved an array of shape %r." % (positions.shape,)
+
+        self.positions = positions
+        self.number_of_points = positions.shape[0]
+
+    @abstractmethod
+    def query_pairs(self, radius):
+        """Finds every unordered pair of points at most radius apart.
+
+        radius: double (query radius)
+
+        -> tuple of two K numpy index arrays (first[k] < second[k])
+        """
+        raise NotImplementedError()
+
+    def degrees(self, radius):
+        """Counts the points within radius of every point (excluding itself).
+
+        radius: double (query radius)
+
+        -> N numpy array (of neighbor counts)
+        """
+        first, second = self.query_pairs(radius)
+        return np.bincount(first, minlength=self.number_of_points) + np.bincount(second, minlength=self.number_of_points)
+
+
+class BruteForceIndex(SpatialIndex):
+    """Tests every pair; O(N^2) memory, only meant for small swarms."""
+
+    def query_pairs(self, radius):
+        within = squared_distances(self.positions) <= radius**2
+        return np.nonzero(np.triu(within, 1))
+
+
+class GridIndex(SpatialIndex):
+    """Uniform grid hash: points are bucketed into square cells and each query
+    only compares points in the same or adjacent cells."""
+
+    # Half of the 3x3 stencil, so every pair of cells is visited once
+    _STENCIL = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+    def __init__(self, positions, cell_size):
+        super().__init__(positions)
+
+        assert cell_size > 0, "The cell size (cell_size) of a grid spatial index must be positive. Recieved %r." % cell_size
+
+        self.cell_size = cell_size
+
+        if self.number_of_points == 0:
+            cells = np.zeros((0, 2), dtype=np.int64)
+        else:
+            cells = np.floor((positions - positions.min(axis=0))/cell_size).astype(np.int64)
+        # Pad by one cell on each side so stencil offsets never wrap between rows
+        self._rows = int(cells[:, 1].max()) + 3 if self.number_of_points else 3
+        self._keys = (cells[:, 0] + 1)*self._rows + cells[:, 1] + 1
+
+        # Points are processed in cell order so each cell's members are contiguous
+        self._order = np.argsort(self._keys, kind="stable")
+        self._sorted_keys = self._keys[self._order]
+        self._sorted_x = positions[self._order, 0]
+        self._sorted_y = positions[self._order, 1]
+
+    def query_pairs(self, radius):
+        assert radius <= self.cell_size, "A grid spatial index can only answer queries up to its cell size %r. Recieved radius %r." % (self.cell_size, radius)
+
+        first, second = [], []
+        points = np.arange(self.number_of_points)
+        for dx, dy in self._STENCIL:
+            other_keys = self._sorted_keys + dx*self._rows + dy
+            starts = np.searchsorted(self._sorted_keys, other_keys, side="left")
+            counts = np.searchsorted(self._sorted_keys, other_keys, side="right") - starts
+
+            # Expand each point into one candidate per point of the adjacent cell
+            i = np.repeat(points, counts)
+            j = ragged_ranges(starts, counts)
+
+            if (dx, dy) == (0, 0):
+                keep = i < j
+                i, j = i[keep], j[keep]
+
+            x = self._sorted_x[i] - self._sorted_x[j]
+            y = self._sorted_y[i] - self._sorted_y[j]
+            keep = x*x + y*y <= radius**2
+            i, j = self._order[i[keep]], self._order[j[keep]]
+
+            first.append(np.minimum(i, j))
+            second.append(np.maximum(i, j))
+
+        return np.concatenate(first), np.concatenate(second)
+
+    def query_neighbors(self, indices, radius):
+        """Finds every point within radius of the given points.
+
+        indices: M numpy index array (of query points)
+        radius: double (query radius)
+
+        -> tuple of two K numpy index arrays (query point, neighbor)
+        """
+        assert radius <= self.cell_size, "A grid spatial index can only answer queries up to its cell size %r. Recieved radius %r." % (self.cell_size, radius)
+
+        indices = np.asarray(indices, dtype=np.int64)
+        keys = self._keys[indices]
+        first, second = [], []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                other_keys = keys + dx*self._rows + dy
+                starts = np.searchsorted(self._sorted_keys, other_keys, side="left")
+                counts = np.searchsorted(self._sorted_keys, other_keys, side="right") - starts
+
+                i = np.repeat(indices, counts)
+                j = self._order[ragged_ranges(starts, counts)]
+
+                d = self.positions[i] - self.positions[j]
+                keep = (np.einsum('ij,ij->i', d, d) <= radius**2) & (i != j)
+                first.append(i[keep])
+                second.append(j[keep])
+
+        return np.concatenate(first), np.concatenate(second)
+
+
+class KDTreeIndex(SpatialIndex):
+    """Wraps scipy's cKDTree."""
+
+    def __init__(self, positions):
+        super().__init__(positions)
+
+        self._tree = cKDTree(positions)
+
+    def query_pairs(self, radius):
+        pairs = self._tree.query_pairs(radius, output_type='ndarray')
+        return pairs[:, 0], pairs[:, 1]
+
+    def degrees(self, radius):
+        return self._tree.query_ball_point(self.positions, radius, return_length=True) - 1
+
+
+def create_spatial_index(positions, radius, backend="grid"):
+    """Builds a spatial index able to answer queries up to radius.
+
+    positions: Nx2 numpy array (of x, y positions)
+    radius: double (largest radius that will be queried)
+    backend: string ("grid", "kdtree" or "brute")
+
+    -> SpatialIndex
+    """
+    assert backend in ("grid", "kdtree", "brute"), "In the create_spatial_index function, the backend must be one of 'grid', 'kdtree' or 'brute'. Recieved %r." % backend
+
+    if backend == "grid":
+        return GridIndex(positions, radius)
+    if backend == "kdtree":
+        return KDTreeIndex(positions)
+    return BruteForceIndex(positions)
+
+
+def _contains(sorted_keys, keys):
+    # Membership of keys in a sorted array without hashing
+    if sorted_keys.size == 0:
+        return np.zeros(keys.size, dtype=bool)
+    at = np.minimum(np.searchsorted(sorted_keys, keys), sorted_keys.size - 1)
+    return sorted_keys[at] == keys
+
+
+class _SlotTable:
+    """Rows of integer entries packed at the front of fixed-width slots (-1
+    pads the rest), with an entry count per row and an optional boolean flag
+    per entry.  Rows widen when they overflow."""
+
+    def __init__(self, number_of_rows, capacity, flagged=False):
+        self.values = np.full((number_of_rows, capacity), -1, dtype=np.int64)
+        self.flags = np.zeros((number_of_rows, capacity), dtype=bool) if flagged else None
+        self.counts = np.zeros(number_of_rows, dtype=np.int64)
+
+    @classmethod
+    def build(cls, number_of_rows, rows, values, flags=None, capacity=4):
+        """Creates a table holding values[k] in row rows[k], just wide enough."""
+        counts = np.bincount(rows, minlength=number_of_rows)
+        table = cls(number_of_rows, max(int(counts.max(initial=0)), capacity), flagged=flags is not None)
+        order = np.argsort(rows)
+        rows = rows[order]
+        # Rank of each entry within its row
+        columns = ragged_ranges(0, counts)
+        table.values[rows, columns] = values[order]
+        if flags is not None:
+            table.flags[rows, columns] = flags[order]
+        table.counts = counts
+        return table
+
+    def entries(self, rows):
+        """Every stored entry of the given rows.
+
+        -> tuple of K numpy index arrays (position in rows, column)
+        """
+        counts = self.counts[rows]
+        positions = np.repeat(np.arange(len(rows)), counts)
+        columns = ragged_ranges(0, counts)
+        return positions, columns
+
+    def find(self, rows, values):
+        # Column of values[k] in row rows[k] (the entry must be stored)
+        return np.argmax(self.values[rows] == values[:, None], axis=1)
+
+    def clear(self, rows):
+        self.values[rows] = -1
+        if self.flags is not None:
+            self.flags[rows] = False
+        self.counts[rows] = 0
+
+    def remove(self, rows, values):
+        """Removes values[k] from row rows[k] (the entry must be stored)."""
+        order = np.argsort(rows, kind="stable")
+        rows, values = rows[order], values[order]
+        starts = np.flatnonzero(np.concatenate(([True], rows[1:] != rows[:-1]))) if rows.size else np.zeros(0, dtype=np.int64)
+        rank = ragged_ranges(0, np.diff(np.append(starts, rows.size)))
+
+        # One removal per row at a time: the row's last entry fills the hole
+        for r in range(int(rank.max(initial=-1)) + 1):
+            at = rank == r
+            row = rows[at]
+            column = self.find(row, values[at])
+            last = self.counts[row] - 1
+            self.values[row, column] = self.values[row, last]
+            self.values[row, last] = -1
+            if self.flags is not None:
+                self.flags[row, column] = self.flags[row, last]
+                self.flags[row, last] = False
+            self.counts[row] = last
+
+    def insert(self, rows, values, flags=None):
+        """Appends values[k] to row rows[k]."""
+        if rows.size == 0:
+            return
+        order = np.argsort(rows, kind="stable")
+        rows = rows[order]
+        # rows is sorted, so each row's entries form a run
+        starts = np.flatnonzero(np.concatenate(([True], rows[1:] != rows[:-1])))
+        needed = np.diff(np.append(starts, rows.size))
+        touched = rows[starts]
+
+        shortfall = int((self.counts[touched] + needed).max()) - self.values.shape[1]
+        if shortfall > 0:
+            grow = max(shortfall, self.values.shape[1]//4, 4)
+            self.values = np.pad(self.values, ((0, 0), (0, grow)), constant_values=-1)
+            if self.flags is not None:
+                self.flags = np.pad(self.flags, ((0, 0), (0, grow)))
+
+        columns = self.counts[rows] + ragged_ranges(0, needed)
+        self.values[rows, columns] = values[order]
+        if self.flags is not None:
+            self.flags[rows, columns] = False if flags is None else flags[order]
+        self.counts[touched] += needed
+
+
+class NeighborTracker:
+    """Maintains the fixed-radius neighbor graph of moving points across steps.
+
+    Verlet-list scheme: every point keeps a list of candidate partners within
+    radius + skin, and only the candidates of points that drifted more than
+    skin/4 from where their candidates were last gathered are regenerated.
+    Every pair within radius is always a candidate (both endpoints together
+    move less than the skin between refreshes).
+
+    The candidates live in a partner table (every pair is stored in both
+    rows, flagged when within radius), and points are bucketed by their
+    reference positions in a persistent spatial hash whose rows are hashed
+    grid cells (cells sharing a row only add candidates that the distance
+    test rejects).  An update only reads and writes the rows of the points
+    that moved and rebuckets only the stale ones, so it costs O(moved points)
+    rather than O(N).  Only when most points moved does it fall back to
+    re-testing the whole table, or to a rebuild when most are stale.
+    """
+
+    # Above this fraction of moved (stale) points an update re-tests (rebuilds) everything at once
+    rebuild_fraction = 0.125
+
+    # 3x3 stencil of adjacent cells
+    _STENCIL = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)], dtype=np.int64)
+
+    def __init__(self, positions, radius, skin):
+        #Check user input types
+        assert isinstance(positions, np.ndarray), "The robot positions (positions) provided to create a NeighborTracker must be a numpy ndarray. Recieved type %r." % type(positions).__name__
+        #Check user input ranges/sizes
+        assert radius > 0, "The radius (radius) of a NeighborTracker must be positive. Recieved %r." % radius
+        assert skin > 0, "The skin (skin) of a NeighborTracker must be positive. Recieved %r." % skin
+
+        self.radius = radius
+        self.skin = skin
+        self.number_of_points = positions.shape[0]
+        # A point's bucket follows its reference position, which is at most skin/4
+        # from where it is, so cells this wide keep every candidate in the 3x3 stencil
+        self.cell_size = radius + 1.25*skin
+
+        self._reference_positions = np.array(positions, dtype=float)
+        self._previous_positions = self._reference_positions.copy()
+
+        self._hash_rows = 1 << max(int(self.number_of_points - 1).bit_length(), 4)
+        self._rebuild(self._reference_positions)
+
+    def _rebuild(self, positions):
+        # Buckets and candidates of every point from scratch, as at construction
+        self._reference_positions[:] = positions
+        points = np.arange(self.number_of_points, dtype=np.int64)
+        self._bucket_of = self._hash(self._cells(points))
+        self._buckets = _SlotTable.build(self._hash_rows, self._bucket_of, points)
+
+        first, second = GridIndex(positions, self.radius + self.skin).query_pairs(self.radius + self.skin)
+        within = self._distance_test(positions, first, second)
+        self._partners = _SlotTable.build(self.number_of_points, np.concatenate((first, second)), np.concatenate((second, first)),
+                                          np.concatenate((within, within)), capacity=8)
+        self.last_refreshed = self.number_of_points
+
+    def _cells(self, points):
+        return np.floor(self._reference_positions[points]/self.cell_size).astype(np.int64)
+
+    def _hash(self, cells):
+        return ((cells[..., 0]*73856093) ^ (cells[..., 1]*19349663)) & (self._hash_rows - 1)
+
+    def _distance_test(self, positions, first, second, radius=None):
+        # As complex numbers a point is gathered in one access instead of two
+        points = np.ascontiguousarray(positions, dtype=float).view(np.complex128).ravel()
+        d = points[first] - points[second]
+        return d.real**2 + d.imag**2 <= (self.radius if radius is None else radius)**2
+
+    def _pairs_of(self, points, is_listed):
+        # Stored pairs of the given points, each once: (point, partner, column in the point's row)
+        rows, columns = self._partners.entries(points)
+        first = points[rows]
+        second = self._partners.values[first, columns]
+        # A pair of two listed points is found from both rows; keep one copy
+        once = ~is_listed[second] | (first < second)
+        return first[once], second[once], columns[once]
+
+    def _edge_arrays(self, table):
+        rows, columns = np.nonzero(table)
+        partners = self._partners.values[rows, columns]
+        keep = rows < partners
+        return rows[keep], partners[keep]
+
+    @property
+    def edges(self):
+        """Unordered pairs currently within radius, as two index arrays (first < second)."""
+        return self._edge_arrays(self._partners.flags)
+
+    @property
+    def candidate_pairs(self):
+        """Unordered pairs that may be within radius, as two index arrays (first < second)."""
+        return self._edge_arrays(self._partners.values >= 0)
+
+    def _refresh(self, positions, stale):
+        # Regenerates the candidates of the stale points; -> the edges that stopped being candidates
+        is_stale = np.zeros(self.number_of_points, dtype=bool)
+        is_stale[stale] = True
+        first, second, columns = self._pairs_of(stale, is_stale)
+        old_keys = np.minimum(first, second)*self.number_of_points + np.maximum(first, second)
+
+        # Rebucket them at their new reference positions
+        self._reference_positions[stale] = positions[stale]
+        cells = self._cells(stale)
+        buckets = self._hash(cells)
+        changed = buckets != self._bucket_of[stale]
+        self._buckets.remove(self._bucket_of[stale[changed]], stale[changed])
+        self._buckets.insert(buckets[changed], stale[changed])
+        self._bucket_of[stale] = buckets
+
+        # Gather candidates from the buckets of the adjacent cells; two cells
+        # of the stencil sharing a bucket row would list its points twice
+        near = np.sort(self._hash(cells[:, None, :] + self._STENCIL), axis=1)
+        distinct = np.ones(near.shape, dtype=bool)
+        distinct[:, 1:] = near[:, 1:] != near[:, :-1]
+        owners = np.broadcast_to(stale[:, None], near.shape)[distinct]
+        near = near[distinct]
+        rows, slots = self._buckets.entries(near)
+        new_first, new_second = owners[rows], self._buckets.values[near[rows], slots]
+        keep = (new_first != new_second) & (~is_stale[new_second] | (new_first < new_second))
+        new_first, new_second = new_first[keep], new_second[keep]
+        keep = self._distance_test(positions, new_first, new_second, self.radius + self.skin)
+        new_first, new_second = new_first[keep], new_second[keep]
+        new_keys = np.minimum(new_first, new_second)*self.number_of_points + np.maximum(new_first, new_second)
+
+        # Only candidates that vanished or appeared touch the partner table;
+        # searching sorted keys in sorted keys keeps the lookups cache friendly
+        order = np.argsort(old_keys)
+        first, second, columns, old_keys = first[order], second[order], columns[order], old_keys[order]
+        order = np.argsort(new_keys)
+        new_first, new_second, new_keys = new_first[order], new_second[order], new_keys[order]
+        vanished = ~_contains(new_keys, old_keys)
+        fresh = ~_contains(old_keys, new_keys)
+        dropped = vanished & self._partners.flags[first, columns]
+        self._partners.remove(np.concatenate((first[vanished], second[vanished])), np.concatenate((second[vanished], first[vanished])))
+        self._partners.insert(np.concatenate((new_first[fresh], new_second[fresh])), np.concatenate((new_second[fresh], new_first[fresh])))
+
+        return first[dropped], second[dropped]
+
+    def update(self, positions, moved=None):
+        """Moves the points to positions and updates the neighbor graph.
+
+        positions: Nx2 numpy array (of new x, y positions)
+        moved: numpy index array (of the points that moved since the last
+               update, found by comparing positions if omitted)
+
+        -> tuple of (added, removed), each a tuple of two index arrays
+           (first < second) of edges that appeared or disappeared
+        """
+        assert positions.shape == self._reference_positions.shape, "A NeighborTracker was built for %r points. Recieved positions of shape %r." % (self.number_of_points, positions.shape)
+
+        if moved is None:
+            moved = np.flatnonzero(np.any(positions != self._previous_positions, axis=1))
+        else:
+            moved = np.unique(np.asarray(moved, dtype=np.int64))
+        self._previous_positions[moved] = positions[moved]
+
+        drift = positions[moved] - self._reference_positions[moved]
+        stale = moved[np.einsum('ij,ij->i', drift, drift) > (self.skin/4)**2]
+        self.last_refreshed = stale.size
+
+        if stale.size > self.number_of_points*self.rebuild_fraction:
+            # Refreshing most points one by one costs more than starting over
+            first, second = self.edges
+            old = np.sort(first*self.number_of_points + second)
+            self._rebuild(positions)
+            first, second = self.edges
+            new = np.sort(first*self.number_of_points + second)
+            return (np.divmod(new[~_contains(old, new)], self.number_of_points),
+                    np.divmod(old[~_contains(new, old)], self.number_of_points))
+
+        dropped = self._refresh(positions, stale) if stale.size else (np.zeros(0, dtype=np.int64),)*2
+
+        if moved.size > self.number_of_points*self.rebuild_fraction:
+            # Most pairs moved; re-testing the whole table saves finding their mirrors
+            listed = self._partners.values >= 0
+            first, columns = np.nonzero(listed)
+            second = self._partners.values[first, columns]
+            now_within = self._distance_test(positions, first, second)
+            changed = self._partners.flags[listed] != now_within
+            self._partners.flags[listed] = now_within
+            changed &= first < second
+            first, second, now_within = first[changed], second[changed], now_within[changed]
+        else:
+            # Only pairs with a moved endpoint can have crossed the radius
+            is_moved = np.zeros(self.number_of_points, dtype=bool)
+            is_moved[moved] = True
+            first, second, columns = self._pairs_of(moved, is_moved)
+            now_within = self._distance_test(positions, first, second)
+            changed = self._partners.flags[first, columns] != now_within
+            first, second, columns, now_within = first[changed], second[changed], columns[changed], now_within[changed]
+            self._partners.flags[first, columns] = now_within
+            self._partners.flags[second, self._partners.find(second, first)] = now_within
+
+        keys = np.minimum(first, second)*self.number_of_points + np.maximum(first, second)
+        removed = np.concatenate((keys[~now_within], np.minimum(*dropped)*self.number_of_points + np.maximum(*dropped)))
+        return np.divmod(np.sort(keys[now_within]), self.number_of_points), np.divmod(np.sort(removed), self.number_of_points)
@@ -0,0 +1,281 @@
+from collections.abc import MutableMapping, Sequence
+
+import numpy as np
+
+from rps.utilities.graph import ragged_ranges
+from rps.utilities.ranging import RangeCache, apply_range_noise
+
+# SwarmState keeps every per-robot quantity in contiguous arrays indexed by an
+# integer robot index (structure of arrays).  Robot objects are only created
+# on demand as RobotView instances, which read and write through to the
+# arrays, so code written against the per-object Robot API keeps working.
+
+class SwarmState:
+
+    def __init__(self, positions, std_noise=0, neighbor_radius=2, id_prefix="rb", rng=None):
+        #Check user input types
+        assert isinstance(positions, np.ndarray), "The robot positions (positions) provided to create a SwarmState must be a numpy ndarray. Recieved type %r." % type(positions).__name__
+        #Check user input ranges/sizes
+        assert positions.ndim == 2 and positions.shape[1] == 2, "The robot positions (positions) provided to create a SwarmState must be an Nx2 array. Recieved an array of shape %r." % (positions.shape,)
+
+        self.number_of_robots = positions.shape[0]
+        self.std_noise = std_noise
+        self.neighbor_radius = neighbor_radius
+        self.id_prefix = id_prefix
+        self.rng = np.random if rng is None else rng
+
+        self.ids = np.arange(self.number_of_robots, dtype=np.int64)
+        self.positions = np.ascontiguousarray(positions, dtype=np.float64)
+        # Positions in the leader's frame, nan until a robot is localized
+        self.estimated_positions = np.full((self.number_of_robots, 2), np.nan)
+        self.localized = np.zeros(self.number_of_robots, dtype=bool)
+        self.leader_bids = np.zeros(self.number_of_robots, dtype=np.int64)
+        self.leader = -1
+        self.reference = np.zeros(0, dtype=np.int64)
+        # Every phase reads ranges through this cache; invalidate it for robots that move
+        self.range_cache = RangeCache(self.positions, std_noise, self.rng)
+
+        self.clear_neighbors()
+
+    def clear_neighbors(self):
+        # Neighbor graph in CSR form: robot i's neighbors are
+        # neighbor_indices[neighbor_indptr[i]:neighbor_indptr[i+1]], measured at neighbor_ranges
+        self.neighbor_indptr = np.zeros(self.number_of_robots + 1, dtype=np.int64)
+        self.neighbor_indices = np.zeros(0, dtype=np.int64)
+        self.neighbor_ranges = np.zeros(0)
+
+    def set_neighbors(self, rows, cols, ranges=None):
+        """Replaces the neighbor graph with the directed edges rows[k] -> cols[k].
+
+        rows: K numpy index array (of robots)
+        cols: K numpy index array (of their neighbors)
+        ranges: K numpy array (of measured ranges, nan if omitted)
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        if ranges is None:
+            ranges = np.full(rows.size, np.nan)
+
+        order = np.argsort(rows*self.number_of_robots + cols)
+        self.neighbor_indptr = np.searchsorted(rows[order], np.arange(self.number_of_robots + 1))
+        self.neighbor_indices = cols[order]
+        self.neighbor_ranges = np.asarray(ranges, dtype=float)[order]
+
+    def set_neighbor_row(self, i, cols, ranges=None):
+        # Rebuilds the CSR arrays, so only meant for occasional per-robot updates
+        rows, old_cols = self.edges()
+        keep = rows != i
+        cols = np.asarray(cols, dtype=np.int64)
+        if ranges is None:
+            ranges = np.full(cols.size, np.nan)
+        self.set_neighbors(np.concatenate((rows[keep], np.full(cols.size, i))),
+                           np.concatenate((old_cols[keep], cols)),
+                           np.concatenate((self.neighbor_ranges[keep], ranges)))
+
+    def neighbors_of(self, i):
+        return self.neighbor_indices[self.neighbor_indptr[i]:self.neighbor_indptr[i + 1]]
+
+    def edge_slots(self, indices):
+        """Returns where the given robots' edges sit in neighbor_indices and
+        neighbor_ranges, grouped robot by robot in the order given.
+
+        indices: M numpy index array (of robots)
+
+        -> K numpy index array (of edge positions)
+        """
+        starts = self.neighbor_indptr[indices]
+        counts = self.neighbor_indptr[np.asarray(indices) + 1] - starts
+        return ragged_ranges(starts, counts)
+
+    def degrees(self):
+        return np.diff(self.neighbor_indptr)
+
+    def edges(self):
+        """Returns the directed (robot, neighbor) pairs of the neighbor graph.
+
+        -> tuple of two K numpy index arrays
+        """
+        return np.repeat(self.ids, self.degrees()), self.neighbor_indices
+
+    def name(self, i):
+        return self.id_prefix + str(self.ids[i])
+
+    def index_of(self, name):
+        assert name.startswith(self.id_prefix), "Robot id %r does not belong to this swarm (ids start with %r)." % (name, self.id_prefix)
+        return int(name[len(self.id_prefix):])
+
+    def robots(self):
+        return RobotViews(self)
+
+
+class RobotView:
+    """Per-robot view into a SwarmState with the attributes of the original Robot class."""
+
+    __slots__ = ("swarm", "index")
+
+    def __init__(self, swarm, index):
+        self.swarm = swarm
+        self.index = index
+
+    def __eq__(self, other):
+        return isinstance(other, RobotView) and other.swarm is self.swarm and other.index == self.index
+
+    def __hash__(self):
+        return hash((id(self.swarm), self.index))
+
+    def __repr__(self):
+        return "RobotView(%r)" % self.id
+
+    @property
+    def id(self):
+        return self.swarm.name(self.index)
+
+    @property
+    def x(self):
+        return self.swarm.positions[self.index, 0]
+
+    @x.setter
+    def x(self, value):
+        self.swarm.positions[self.index, 0] = value
+        self.swarm.range_cache.invalidate([self.index])
+
+    @property
+    def y(self):
+        return self.swarm.positions[self.index, 1]
+
+    @y.setter
+    def y(self, value):
+        self.swarm.positions[self.index, 1] = value
+        self.swarm.range_cache.invalidate([self.index])
+
+    @property
+    def std_noise(self):
+        return self.swarm.std_noise
+
+    @property
+    def neighbors(self):
+        return [RobotView(self.swarm, j) for j in self.swarm.neighbors_of(self.index).tolist()]
+
+    @neighbors.setter
+    def neighbors(self, robots):
+        # Ranges come from the cache, so they are the ones distance_to measured
+        # (e.g. in update_neighbors) and reference selection can sort the row
+        indices = np.array([robot.index for robot in robots], dtype=np.int64)
+        ranges = self.swarm.range_cache.measure(np.full(indices.size, self.index), indices)
+        self.swarm.set_neighbor_row(self.index, indices, ranges)
+
+    @property
+    def leader_bid(self):
+        return int(self.swarm.leader_bids[self.index])
+
+    @leader_bid.setter
+    def leader_bid(self, value):
+        self.swarm.leader_bids[self.index] = value
+
+    @property
+    def leader_id(self):
+        return self.id if self.swarm.leader == self.index else None
+
+    @leader_id.setter
+    def leader_id(self, value):
+        if value is not None:
+            self.swarm.leader = self.index
+        elif self.swarm.leader == self.index:
+            self.swarm.leader = -1
+
+    @property
+    def reference_robots(self):
+        if self.swarm.leader != self.index:
+            return None
+        return [RobotView(self.swarm, j) for j in self.swarm.reference.tolist()]
+
+    @reference_robots.setter
+    def reference_robots(self, robots):
+        self.swarm.reference = np.array([robot.index for robot in robots], dtype=np.int64)
+
+    def update_neighbors(self, robots):
+        self.neighbors = [robot for robot in robots if self.distance_to(robot) <= self.swarm.neighbor_radius and robot.id != self.id]
+
+    def distance_to(self, other_robot):
+        if isinstance(other_robot, RobotView) and other_robot.swarm is self.swarm:
+            return self.swarm.range_cache.measure([self.index], [other_robot.index])[0]
+        true_distance_squared = (self.x - other_robot.x)**2 + (self.y - other_robot.y)**2
+        return apply_range_noise(true_distance_squared, self.swarm.std_noise, self.swarm.rng)[()]
+
+
+class RobotViews(Sequence):
+    """Read-only sequence of RobotView objects, created lazily on access."""
+
+    def __init__(self, swarm):
+        self.swarm = swarm
+
+    def __len__(self):
+        return self.swarm.number_of_robots
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [RobotView(self.swarm, j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("robot index out of range")
+        return RobotView(self.swarm, int(i))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield RobotView(self.swarm, i)
+
+
+class PositionMapping(MutableMapping):
+    """Dictionary-style view mapping robot ids to (x, y) rows of a position array.
+
+    When a present mask is given, only robots whose entry is True are keys;
+    assigning a position marks the robot present.
+    """
+
+    def __init__(self, swarm, positions, present=None):
+        self.swarm = swarm
+        self.positions = positions
+        self.present = present
+
+    def _index(self, name):
+        try:
+            i = self.swarm.index_of(name)
+        except (AssertionError, ValueError):
+            raise KeyError(name)
+        if not 0 <= i < self.swarm.number_of_robots or (self.present is not None and not self.present[i]):
+            raise KeyError(name)
+        return i
+
+    def __getitem__(self, name):
+        return tuple(self.positions[self._index(name)].tolist())
+
+    def _moved(self, i):
+        # Cached ranges of a robot whose true position changed are stale
+        if self.positions is self.swarm.positions:
+            self.swarm.range_cache.invalidate([i])
+
+    def __setitem__(self, name, position):
+        i = self.swarm.index_of(name)
+        self.positions[i] = position
+        self._moved(i)
+        if self.present is not None:
+            self.present[i] = True
+
+    def __delitem__(self, name):
+        assert self.present is not None, "Robots cannot be removed from a position mapping without a present mask."
+        i = self._index(name)
+        self.present[i] = False
+        self.positions[i] = np.nan
+        self._moved(i)
+
+    def __iter__(self):
+        indices = self.swarm.ids if self.present is None else np.flatnonzero(self.present)
+        for i in indices.tolist():
+            yield self.swarm.name(i)
+
+    def __len__(self):
+        return self.swarm.number_of_robots if self.present is None else int(np.count_nonzero(self.present))
+
+    def __repr__(self):
+        return repr(dict(self.items()))
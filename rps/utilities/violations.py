@@ -0,0 +1,92 @@
+import numpy as np
+
+# ViolationAccumulator keeps the error counts of a simulator in arrays owned
+# by that simulator: per-robot boundary and collision counts and an actuator
+# counter, with optional leading batch dimensions so BatchRobotarium can keep
+# one set per environment.  The worst robot's counts are maintained as they
+# grow, so reading the end-of-script summary is constant time.
+
+class ViolationAccumulator:
+
+    boundary_string = "iteration(s) robots were outside the boundaries."
+    collision_string = "iteration(s) where robots collided."
+    actuator_string = "iteration(s) where the actuator limits were exceeded."
+
+    def __init__(self, number_of_robots, batch_shape=()):
+        """
+        number_of_robots: int (robots per simulator)
+        batch_shape: tuple (leading dimensions, () for a single simulator)
+        """
+        assert number_of_robots >= 0, "The number of robots (number_of_robots) of a ViolationAccumulator must not be negative. Recieved %r." % number_of_robots
+
+        self.number_of_robots = number_of_robots
+        self.batch_shape = tuple(batch_shape)
+        self.reset()
+
+    def reset(self):
+        """Clears every count."""
+        robot_shape = self.batch_shape + (self.number_of_robots,)
+        self.iterations = 0
+        self.boundary = np.zeros(robot_shape, dtype=np.int64)
+        self.collision = np.zeros(robot_shape, dtype=np.int64)
+        self.actuator = np.zeros(self.batch_shape, dtype=np.int64)
+
+        # Iterations in which any robot was outside or collided
+        self.boundary_iterations = np.zeros(self.batch_shape, dtype=np.int64)
+        self.collision_iterations = np.zeros(self.batch_shape, dtype=np.int64)
+
+        self._worst_boundary = np.zeros(self.batch_shape, dtype=np.int64)
+        self._worst_collision = np.zeros(self.batch_shape, dtype=np.int64)
+
+    def record(self, outside, partners, exceeding):
+        """Adds one iteration's checks.
+
+        outside: ...xN boolean numpy array (robots outside the boundaries)
+        partners: ...xN numpy int array (robots each robot collided with)
+        exceeding: ... boolean numpy array (whether actuator limits were exceeded)
+        """
+        self.iterations += 1
+        self.boundary += outside
+        self.collision += partners
+        self.actuator += exceeding
+
+        self.boundary_iterations += np.any(outside, axis=-1)
+        self.collision_iterations += np.any(partners, axis=-1)
+
+        # Counts only grow, so the worst robot is updated from the new counts
+        if self.number_of_robots:
+            np.maximum(self._worst_boundary, self.boundary.max(axis=-1), out=self._worst_boundary)
+            np.maximum(self._worst_collision, self.collision.max(axis=-1), out=self._worst_collision)
+
+    def summary(self):
+        """The counts call_at_scripts_end reports.
+
+        -> dict with "boundary" and "collision" (the worst robot's count) and
+           "actuator" (iterations over the limits), each of the batch shape
+        """
+        return {"boundary": self._worst_boundary.copy(), "collision": self._worst_collision.copy(), "actuator": self.actuator.copy()}
+
+    def snapshot(self):
+        """Copies the current counts, e.g. to mark the start of a window.
+
+        -> dict of numpy arrays and "iterations" (int)
+        """
+        return {"iterations": self.iterations, "boundary": self.boundary.copy(), "collision": self.collision.copy(), "actuator": self.actuator.copy(),
+                "boundary_iterations": self.boundary_iterations.copy(), "collision_iterations": self.collision_iterations.copy()}
+
+    def since(self, snapshot):
+        """Statistics of the window between a snapshot and now.
+
+        snapshot: dict (returned by snapshot)
+
+        -> dict with the per-robot and actuator counts accumulated in the
+           window, "iterations" (int) and the fraction of the window's
+           iterations with a boundary, collision or actuator violation
+        """
+        window = {name: value - snapshot[name] for name, value in self.snapshot().items()}
+        iterations = max(window["iterations"], 1)
+        window["boundary_rate"] = window["boundary_iterations"]/iterations
+        window["collision_rate"] = window["collision_iterations"]/iterations
+        window["actuator_rate"] = window["actuator"]/iterations
+
+        return window
@@ -0,0 +1,38 @@
+import numpy as np
+
+from rps.utilities.ekf import SwarmEKF, other_robots, range_measurements
+from rps.utilities.recording import TrajectoryRecorder
+
+
+def _run(ekf, positions, neighbors, rng, steps, recorder=None, first_step=0):
+    for step in range(first_step, first_step + steps):
+        ekf.predict(1)
+        ranges, H, mask = range_measurements(positions, neighbors, 0.5, rng)
+        ekf.update(ranges, H, mask)
+        if recorder is not None:
+            recorder.record(step, **ekf.checkpoint_arrays())
+
+
+def test_resumed_adaptive_run_matches_continuous_run(tmp_path):
+    positions = np.random.default_rng(1).uniform(0, 10, size=(8, 2))
+    neighbors = other_robots(8)
+
+    continuous = SwarmEKF(positions, 0.1, update_form="joseph", adaptive_window=5)
+    _run(continuous, positions, neighbors, np.random.default_rng(2), 20)
+
+    rng = np.random.default_rng(2)
+    interrupted = SwarmEKF(positions, 0.1, update_form="joseph", adaptive_window=5)
+    shapes = {name: array.shape for name, array in interrupted.checkpoint_arrays().items()}
+    recorder = TrajectoryRecorder(str(tmp_path), shapes, capacity=4)
+    _run(interrupted, positions, neighbors, rng, 12, recorder)
+    recorder.flush()
+
+    resumed = SwarmEKF(positions, 0.1, update_form="joseph", adaptive_window=5)
+    step, arrays = TrajectoryRecorder(str(tmp_path), shapes, capacity=4).latest()
+    resumed.restore(arrays)
+    _run(resumed, positions, neighbors, rng, 8, first_step=step + 1)
+
+    assert not np.allclose(resumed.measurement_noise, 0.1**2)
+    np.testing.assert_allclose(resumed.states, continuous.states, rtol=1e-12, atol=1e-12)
+    np.testing.assert_allclose(resumed.measurement_noise, continuous.measurement_noise, rtol=1e-12)
+    np.testing.assert_allclose(resumed.process_noise, continuous.process_noise, rtol=1e-12, atol=1e-15)
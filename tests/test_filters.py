@@ -0,0 +1,18 @@
+import numpy as np
+
+from rps.utilities.ekf import other_robots, range_measurements
+from rps.utilities.filters import SwarmParticleFilter, neighbor_positions
+
+
+def test_particle_filter_error_stays_bounded():
+    rng = np.random.default_rng(0)
+    positions = rng.uniform(0, 10, size=(15, 2))
+    neighbors = other_robots(15)
+    pf = SwarmParticleFilter(positions, 0.1, 2000, rng=rng)
+
+    for step in range(60):
+        pf.predict(1)
+        ranges, _, mask = range_measurements(positions, neighbors, 0.1, rng)
+        pf.update(neighbor_positions(positions, neighbors), ranges, mask)
+        errors = positions - pf.positions
+        assert np.mean(np.einsum('ij,ij->i', errors, errors)) < 1
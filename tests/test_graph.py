@@ -0,0 +1,15 @@
+import numpy as np
+
+from rps.utilities.graph import ragged_ranges
+
+
+def test_ragged_ranges_concatenates_each_range():
+    starts = np.array([5, 0, 9, 2])
+    counts = np.array([2, 0, 3, 1])
+    expected = np.concatenate([np.arange(start, start + count) for start, count in zip(starts, counts)])
+    assert np.array_equal(ragged_ranges(starts, counts), expected)
+
+
+def test_ragged_ranges_from_zero_ranks_entries_within_their_range():
+    assert np.array_equal(ragged_ranges(0, np.array([3, 1, 2])), [0, 1, 2, 0, 0, 1])
+    assert ragged_ranges(0, np.zeros(0, dtype=np.int64)).size == 0
@@ -0,0 +1,23 @@
+import numpy as np
+
+from rps.utilities.ranging import RangeCache, detectable_distance
+
+
+def test_range_cache_filled_in_one_call_answers_repeated_pairs_consistently():
+    rng = np.random.default_rng(0)
+    cache = RangeCache(rng.uniform(0, 10, (50, 2)), 0.1, rng)
+    rows = rng.integers(0, 50, 400)
+    cols = rng.integers(0, 50, 400)
+
+    ranges = cache.measure(rows, cols)
+    keys = rows*50 + cols
+    assert len(cache) == np.unique(keys).size
+    for key in np.unique(keys):
+        assert np.unique(ranges[keys == key]).size == 1
+    assert np.array_equal(cache.measure(rows[::-1], cols[::-1]), ranges[::-1])
+
+
+def test_detectable_distance_tightens_with_small_noise():
+    assert np.isclose(detectable_distance(2, 0.1), np.sqrt(4.8))
+    assert np.isclose(detectable_distance(2, 10), (1 + np.sqrt(17))/2)
+    assert detectable_distance(2, 0) == 2
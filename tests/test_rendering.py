@@ -0,0 +1,35 @@
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+from rps.robotarium import Robotarium
+
+
+def test_steps_survive_clearing_the_figure():
+    r = Robotarium(5, show_figure=True, sim_in_real_time=False)
+    try:
+        for iteration in range(3):
+            r.get_poses()
+            # a_robotarium.py redraws its own plot on the Robotarium figure every step
+            plt.clf()
+            plt.scatter(np.arange(3), np.arange(3))
+            plt.pause(0.001)
+            r.step()
+        assert r.renderer.detached
+    finally:
+        plt.close("all")
+
+
+def test_blitted_robots_follow_poses():
+    r = Robotarium(4, show_figure=True, sim_in_real_time=False)
+    try:
+        for iteration in range(3):
+            r.get_poses()
+            r.set_velocities(np.arange(4), np.vstack((np.full(4, 0.1), np.zeros(4))))
+            r.step()
+        chassis = r.renderer.collection.get_paths()[2*4].vertices[:-1]
+        assert np.isfinite(chassis).all()
+        assert np.linalg.norm(chassis.mean(axis=0) - r.poses[:2, 0]) < r.robot_length
+    finally:
+        plt.close("all")
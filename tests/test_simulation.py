@@ -0,0 +1,17 @@
+import numpy as np
+
+from rps.utilities.simulation import collision_counts
+
+
+def test_collision_counts_match_a_pairwise_check_for_a_batch():
+    rng = np.random.default_rng(0)
+    poses = np.concatenate((rng.uniform(-1, 1, (3, 2, 50)), rng.uniform(-np.pi, np.pi, (3, 1, 50))), axis=1)
+    offset, diameter = 0.025, 0.135
+
+    counts = collision_counts(poses, offset, diameter)
+
+    for environment, pose in enumerate(poses):
+        centers = pose[:2].T + offset*np.column_stack((np.cos(pose[2]), np.sin(pose[2])))
+        for robot in range(50):
+            distances = np.linalg.norm(centers - centers[robot], axis=1)
+            assert counts[environment, robot] == np.count_nonzero(distances <= diameter) - 1
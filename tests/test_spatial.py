@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from rps.utilities.spatial import GridIndex, NeighborTracker
+
+
+def _edges(first, second):
+    return set(zip(first.tolist(), second.tolist()))
+
+
+@pytest.mark.parametrize("fraction", [0.02, 0.3, 1.0])
+def test_neighbor_tracker_follows_the_exact_neighbor_graph(fraction):
+    rng = np.random.default_rng(0)
+    radius, skin = 1.0, 0.4
+    positions = rng.uniform(0, 15, (300, 2))
+    tracker = NeighborTracker(positions, radius, skin)
+    current = _edges(*GridIndex(positions, radius).query_pairs(radius))
+    assert _edges(*tracker.edges) == current
+
+    for step in range(30):
+        moved = np.flatnonzero(rng.random(positions.shape[0]) < fraction)
+        positions = positions.copy()
+        positions[moved] += rng.normal(0, skin/rng.choice([3, 30]), (moved.size, 2))
+        added, removed = tracker.update(positions, moved if step % 2 else None)
+
+        expected = _edges(*GridIndex(positions, radius).query_pairs(radius))
+        assert _edges(*added) == expected - current
+        assert _edges(*removed) == current - expected
+        assert _edges(*tracker.edges) == expected
+        current = expected
@@ -0,0 +1,38 @@
+import numpy as np
+
+from algorithmic import Environment
+from rps.utilities.swarm import PositionMapping, SwarmState
+
+
+def _swarm():
+    return SwarmState(np.array([[0.0, 0.0], [3.0, 4.0], [1.0, 1.0]]))
+
+
+def test_moving_a_robot_view_refreshes_its_ranges():
+    swarm = _swarm()
+    first, second = swarm.robots()[0], swarm.robots()[1]
+    assert np.isclose(first.distance_to(second), 5)
+
+    second.x = 6.0
+    second.y = 8.0
+    assert np.isclose(first.distance_to(second), 10)
+
+
+def test_moving_a_robot_through_the_position_mapping_refreshes_its_ranges():
+    swarm = _swarm()
+    first, second = swarm.robots()[0], swarm.robots()[1]
+    assert np.isclose(first.distance_to(second), 5)
+
+    PositionMapping(swarm, swarm.positions)["rb1"] = (0.0, 2.0)
+    assert np.isclose(first.distance_to(second), 2)
+
+
+def test_reference_robots_selected_through_robot_views_are_the_nearest():
+    environment = Environment(30, 0.05, rng=np.random.default_rng(0))
+    environment.initialize_robots()
+    for robot in environment.robots:
+        robot.update_neighbors(environment.robots)
+    leader = max(environment.robots, key=lambda robot: len(robot.neighbors))
+
+    nearest = sorted(leader.neighbors, key=leader.distance_to)[:2]
+    assert environment.select_reference_robots(leader) == nearest
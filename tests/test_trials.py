@@ -0,0 +1,44 @@
+import algorithmic
+from algorithmic import run_trials
+
+
+class _InlineExecutor:
+    # Runs the jobs of a pool in this process, so the options they receive can be seen
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def map(self, function, *iterables):
+        return list(map(function, *iterables))
+
+
+def _record_batches(monkeypatch):
+    options = []
+    run_batch = algorithmic._run_trial_batch
+
+    def recording_batch(num_robots, std_noise, seeds, environment_options):
+        options.append(environment_options)
+        return run_batch(num_robots, std_noise, seeds, environment_options)
+
+    monkeypatch.setattr(algorithmic, "_run_trial_batch", recording_batch)
+    monkeypatch.setattr(algorithmic, "ProcessPoolExecutor", _InlineExecutor)
+    return options
+
+
+def test_trials_in_worker_processes_do_not_open_nested_pools(monkeypatch):
+    options = _record_batches(monkeypatch)
+    run_trials([20], [0.1], 2, seed=0, processes=2, clusters=2)
+    assert options and all(batch["processes"] == 1 and batch["clusters"] == 2 for batch in options)
+
+
+def test_trials_in_this_process_leave_the_cluster_pool_to_the_environment(monkeypatch):
+    options = _record_batches(monkeypatch)
+    monkeypatch.setattr(algorithmic.os, "cpu_count", lambda: 1)
+    run_trials([20], [0.1], 2, seed=0, clusters=2)
+    assert options and all(batch["processes"] is None for batch in options)